@@ -2,13 +2,35 @@ package algo
 
 import (
 	"bufio"
+	"bytes"
+	"encoding/binary"
 	"fmt"
+	"io"
 	"os"
 	"strconv"
 	"strings"
 )
 
-// ReadGraphFromFile reads a graph topology from a file
+// Binary sub-topology format (little-endian), written by the coordinator:
+//
+//	magic [4]byte "SNTB", version uint32,
+//	nodeNum uint32, internalEdgeNum uint32, danglingEdgeNum uint32,
+//	nodes [nodeNum]int32,
+//	internal edges [internalEdgeNum][2]int32 (u, v),
+//	dangling edges [danglingEdgeNum][4]int32 (local, remote, serverID, vxlanID)
+var binaryTopoMagic = []byte("SNTB")
+
+const binaryTopoVersion = 1
+
+type binaryTopoHeader struct {
+	Magic           [4]byte
+	Version         uint32
+	NodeNum         uint32
+	InternalEdgeNum uint32
+	DanglingEdgeNum uint32
+}
+
+// ReadGraphFromFile reads a graph topology from a file, in text or binary format
 func ReadGraphFromFile(filename string) (*Graph, error) {
 	file, err := os.Open(filename)
 	if err != nil {
@@ -16,7 +38,56 @@ func ReadGraphFromFile(filename string) (*Graph, error) {
 	}
 	defer file.Close()
 
-	scanner := bufio.NewScanner(file)
+	reader := bufio.NewReaderSize(file, 1024*1024)
+	magic, err := reader.Peek(len(binaryTopoMagic))
+	if err == nil && bytes.Equal(magic, binaryTopoMagic) {
+		return readGraphFromBinary(reader)
+	}
+	return readGraphFromText(reader)
+}
+
+func readGraphFromBinary(reader io.Reader) (*Graph, error) {
+	var header binaryTopoHeader
+	if err := binary.Read(reader, binary.LittleEndian, &header); err != nil {
+		return nil, fmt.Errorf("invalid binary topology header: %v", err)
+	}
+	if header.Version != binaryTopoVersion {
+		return nil, fmt.Errorf("unsupported binary topology version: %d", header.Version)
+	}
+
+	nodes := make([]int32, header.NodeNum)
+	edges := make([]int32, 2*header.InternalEdgeNum)
+	danglingEdges := make([]int32, 4*header.DanglingEdgeNum)
+	for _, section := range [][]int32{nodes, edges, danglingEdges} {
+		if err := binary.Read(reader, binary.LittleEndian, section); err != nil {
+			return nil, fmt.Errorf("truncated binary topology: %v", err)
+		}
+	}
+
+	graph := &Graph{
+		AdjacencyList:    make(map[int][]int, len(nodes)),
+		DanglingEdgeList: make(map[int][][3]int),
+	}
+	for _, node := range nodes {
+		graph.AdjacencyList[int(node)] = []int{}
+	}
+	for i := 0; i < len(edges); i += 2 {
+		u, v := int(edges[i]), int(edges[i+1])
+		graph.AdjacencyList[u] = append(graph.AdjacencyList[u], v)
+		graph.AdjacencyList[v] = append(graph.AdjacencyList[v], u) // Undirected graph
+	}
+	for i := 0; i < len(danglingEdges); i += 4 {
+		nodeID := int(danglingEdges[i])
+		graph.DanglingEdgeList[nodeID] = append(
+			graph.DanglingEdgeList[nodeID],
+			[3]int{int(danglingEdges[i+1]), int(danglingEdges[i+2]), int(danglingEdges[i+3])})
+	}
+
+	return graph, nil
+}
+
+func readGraphFromText(reader io.Reader) (*Graph, error) {
+	scanner := bufio.NewScanner(reader)
 	scanner.Buffer(make([]byte, 1024*1024), int(1024*1024))
 	graph := NewGraph()
 
@@ -0,0 +1,171 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+from collections import defaultdict
+import numpy as np
+
+CAIDA_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "caida_cache")
+
+# Bump when the parser changes what it produces for the same input
+CAIDA_CACHE_FORMAT_VERSION = 1
+CAIDA_CACHE_ARRAYS = ("asns", "xadj", "adjncy", "rels", "arc_keys", "listed_ids", "countries")
+
+# Relationship of arc u -> v: u is a provider of v, a peer of v, or a customer of v
+REL_P2C, REL_P2P, REL_C2P = -1, 0, 1
+
+
+class CaidaDataset:
+    """Parsed CAIDA AS list and AS relationships, as memory-mappable arrays.
+
+    asns is the ASN interning table, in order of first appearance in the
+    relationship file and then in the AS list. xadj/adjncy is the CSR
+    relationship graph with neighbors in file order, rels the relationship
+    of each arc (REL_P2C, REL_P2P or REL_C2P), and arc_keys the position of
+    each arc's source in the relationship file (2 * line + side).
+    listed_ids are the IDs of ASes in the AS list, in list order, and
+    countries their country codes.
+    """
+
+    def __init__(self, asns, xadj, adjncy, rels, arc_keys, listed_ids, countries):
+        self.asns = asns
+        self.xadj = xadj
+        self.adjncy = adjncy
+        self.rels = rels
+        self.arc_keys = arc_keys
+        self.listed_ids = listed_ids
+        self.countries = countries
+
+    @property
+    def as_num(self):
+        return len(self.asns)
+
+    def get_as_countries(self):
+        """Returns {ASN: country code} of listed ASes, in list order."""
+        return dict(zip(self.asns[self.listed_ids].tolist(), self.countries.tolist()))
+
+    def get_as_graph(self, listed_only=False):
+        """Returns the relationship graph as {ASN: set of neighbor ASNs}.
+
+        ASes and their neighbors are inserted in order of appearance in the
+        relationship file, exactly as if the file was read line by line.
+        With listed_only set, only relationships between listed ASes are kept.
+        """
+        src = np.repeat(np.arange(self.as_num, dtype=np.int64), np.diff(self.xadj))
+        dst = np.asarray(self.adjncy, dtype=np.int64)
+        arc_keys = np.asarray(self.arc_keys)
+        if listed_only:
+            listed = np.zeros(self.as_num, dtype=bool)
+            listed[self.listed_ids] = True
+            valid = listed[src] & listed[dst]
+            src, dst, arc_keys = src[valid], dst[valid], arc_keys[valid]
+
+        # Order ASes by their first valid appearance
+        first_keys = np.full(self.as_num, np.iinfo(np.int64).max, dtype=np.int64)
+        np.minimum.at(first_keys, src, arc_keys)
+        as_order = np.argsort(first_keys, kind='stable')[:len(np.unique(src))]
+
+        names = self.asns.tolist()
+        neighbor_names = self.asns[dst].tolist()
+        bounds = np.zeros(self.as_num + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=self.as_num), out=bounds[1:])
+        bounds = bounds.tolist()
+        graph = defaultdict(set)
+        for u in as_order.tolist():
+            graph[names[u]] = set(neighbor_names[bounds[u]:bounds[u + 1]])
+        return graph
+
+
+#########################
+# Parse CAIDA datasets  #
+#########################
+
+def parse_caida_dataset(as_list_path, as_rel_path):
+    """Parses the AS list JSONL file and the AS relationship file into arrays."""
+    asn2id = {}
+    as1_ids, as2_ids, rel_labels, line_ids = [], [], [], []
+    with open(as_rel_path, 'r') as file:
+        for line_id, line in enumerate(file):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue  # Ignore comment lines
+            parts = line.split("|")
+            if len(parts) != 3:
+                continue  # Ignore malformed lines
+            as1, as2 = parts[0], parts[1]
+            as1_ids.append(asn2id.setdefault(as1, len(asn2id)))
+            as2_ids.append(asn2id.setdefault(as2, len(asn2id)))
+            rel_labels.append(REL_P2C if parts[2] == "-1" else REL_P2P)
+            line_ids.append(line_id)
+
+    listed_asn2country = {}
+    with open(as_list_path, 'r') as file:
+        for line in file:
+            data = json.loads(line)
+            listed_asn2country[data["asn"]] = (data.get("country") or {}).get("iso") or ""
+    listed_ids = np.array(
+        [asn2id.setdefault(asn, len(asn2id)) for asn in listed_asn2country], dtype=np.int64)
+    countries = np.array(list(listed_asn2country.values()), dtype=str)
+
+    # Interleave both directions of each relationship, then stable-sort by source
+    as1_ids = np.array(as1_ids, dtype=np.int64)
+    as2_ids = np.array(as2_ids, dtype=np.int64)
+    rel_labels = np.array(rel_labels, dtype=np.int8)
+    line_ids = np.array(line_ids, dtype=np.int64)
+    arc_src = np.stack([as1_ids, as2_ids], axis=1).reshape(-1)
+    arc_dst = np.stack([as2_ids, as1_ids], axis=1).reshape(-1)
+    arc_rels = np.stack([rel_labels, -rel_labels], axis=1).reshape(-1)
+    arc_keys = np.stack([2 * line_ids, 2 * line_ids + 1], axis=1).reshape(-1)
+    order = np.argsort(arc_src, kind='stable')
+    xadj = np.zeros(len(asn2id) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(arc_src, minlength=len(asn2id)), out=xadj[1:])
+
+    return CaidaDataset(
+        np.array(list(asn2id), dtype=str), xadj,
+        arc_dst[order].astype(np.int32), arc_rels[order], arc_keys[order],
+        listed_ids, countries)
+
+
+###############################
+# Store and load parsed data  #
+###############################
+
+def get_caida_cache_key(as_list_path, as_rel_path, chunk_size=1 << 20):
+    """Content hash of both CAIDA input files."""
+    hasher = hashlib.sha256(f"v{CAIDA_CACHE_FORMAT_VERSION}:".encode())
+    for path in (as_list_path, as_rel_path):
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+        hasher.update(b"\0")
+    return hasher.hexdigest()[:32]
+
+def save_caida_dataset(dataset, entry_dir):
+    """Stores the dataset as .npy files, which are moved in place atomically."""
+    cache_dir = os.path.dirname(entry_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=f".{os.path.basename(entry_dir)}.", dir=cache_dir)
+    try:
+        for array_name in CAIDA_CACHE_ARRAYS:
+            np.save(os.path.join(tmp_dir, f"{array_name}.npy"), getattr(dataset, array_name))
+        os.rename(tmp_dir, entry_dir)
+    except OSError:
+        # Another process has stored the same entry in the meantime
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.isdir(entry_dir):
+            raise
+
+def load_caida_dataset(as_list_path, as_rel_path, cache_dir=CAIDA_CACHE_DIR):
+    """Memory-maps the parsed CAIDA dataset, parsing the input files on a cache miss."""
+    entry_dir = os.path.join(cache_dir, get_caida_cache_key(as_list_path, as_rel_path))
+    if not os.path.isdir(entry_dir):
+        save_caida_dataset(parse_caida_dataset(as_list_path, as_rel_path), entry_dir)
+    else:
+        print(f"CAIDA dataset loaded from cache entry {entry_dir}")
+    return CaidaDataset(*[
+        np.load(os.path.join(entry_dir, f"{array_name}.npy"), mmap_mode='r')
+        for array_name in CAIDA_CACHE_ARRAYS])
@@ -1,34 +1,16 @@
-import json
 import argparse
-from collections import defaultdict, Counter
-
-def load_as_list(as_list_path, region_filter):
-    """Load AS numbers from the AS list JSONL file and filter by region."""
-    as_numbers = {}
-    with open(as_list_path, 'r') as file:
-        for line in file:
-            data = json.loads(line)
-            as_numbers[data["asn"]] = data["country"]["iso"]
-    return as_numbers
-
-def load_as_relationships(as_rel_path):
-    """Load AS relationships from the relationship file, ignoring comments."""
-    graph = defaultdict(set)
-    with open(as_rel_path, 'r') as file:
-        for line in file:
-            line = line.strip()
-            if not line or line.startswith("#"):
-                continue  # Ignore comment lines
-            parts = line.split("|")
-            if len(parts) != 3:
-                continue  # Ignore malformed lines
-            as1, as2 = parts[0], parts[1]
-            graph[as1].add(as2)
-            graph[as2].add(as1)
-    return graph
+from collections import defaultdict
+from caida_cache import load_caida_dataset
 
 def expand_topology(graph, as_numbers, target_count, region_filter):
-    """Expand the topology by iteratively adding ASes with the most connections to existing nodes."""
+    """Expand the topology by iteratively adding ASes with the most connections to existing nodes.
+
+    All outside ASes with the most connections are added at once, in order of
+    discovery: by the position of their earliest added neighbor in the
+    topology, then by their position in that neighbor's adjacency set.
+    Connection counts are kept in buckets and only updated for neighbors of
+    newly added ASes, instead of being recounted over the whole topology.
+    """
     if not graph:
         print("No valid topology.")
         return {}
@@ -39,45 +21,62 @@ def expand_topology(graph, as_numbers, target_count, region_filter):
         print("No ASes found in the specified regions.")
         return {}
     
-    expanded_graph = {asn: set() for asn in seed_asns}
-    for asn in seed_asns:
-        expanded_graph[asn] = graph[asn].copy()
-    
-    while len(expanded_graph) < target_count:
-        # Count connections between current topology and outside nodes
-        candidate_counts = Counter()
-        for asn in expanded_graph:
+    expanded_asns = {} # AS -> position in the topology, in order of addition
+    candidate_counts = {} # Outside AS -> number of connections to the topology
+    candidate_keys = {} # Outside AS -> (position of the discovering AS, index in its adjacency set)
+    count_buckets = defaultdict(dict) # Number of connections -> outside ASes, used as an ordered set
+    max_connections = 0
+    total_links = 0
+
+    def add_asns(asns):
+        nonlocal max_connections, total_links
+        for asn in asns:
+            expanded_asns[asn] = len(expanded_asns)
+            count = candidate_counts.pop(asn, None)
+            if count is not None:
+                del count_buckets[count][asn]
+                del candidate_keys[asn]
             for neighbor in graph[asn]:
-                if neighbor not in expanded_graph:
-                    candidate_counts[neighbor] += 1
-        
+                if neighbor in expanded_asns:
+                    total_links += 1 if neighbor == asn else 2
+        # Count connections only after the whole batch is added
+        for asn in asns:
+            position = expanded_asns[asn]
+            for index, neighbor in enumerate(graph[asn]):
+                if neighbor in expanded_asns:
+                    continue
+                count = candidate_counts.get(neighbor, 0)
+                if count:
+                    del count_buckets[count][neighbor]
+                else:
+                    candidate_keys[neighbor] = (position, index)
+                candidate_counts[neighbor] = count + 1
+                count_buckets[count + 1][neighbor] = None
+                max_connections = max(max_connections, count + 1)
+        while max_connections > 0 and not count_buckets[max_connections]:
+            max_connections -= 1
+
+    add_asns(list(seed_asns))
+
+    while len(expanded_asns) < target_count:
         if not candidate_counts:
             print("No more connections available for expansion.")
             break
         
         # Select AS(es) with the highest number of connections to current topology
-        max_connections = max(candidate_counts.values())
-        candidates = [asn for asn, count in candidate_counts.items() if count == max_connections]
+        candidates = sorted(count_buckets[max_connections], key=candidate_keys.__getitem__)
+        cur_max_connections = max_connections
         
         # Add selected AS(es) to the topology
-        for asn in candidates:
-            if len(expanded_graph) >= target_count:
-                break
-            expanded_graph[asn] = graph[asn].copy()
-        
-        # Remove dangling edges (edges to nodes outside expanded_graph)
-        for asn in expanded_graph:
-            expanded_graph[asn] = {neighbor for neighbor in expanded_graph[asn] if neighbor in expanded_graph}
-        
-        # Compute total link number in current topology
-        total_links = sum(len(neighbors) for neighbors in expanded_graph.values()) // 2
+        add_asns(candidates[:target_count - len(expanded_asns)])
         
-        print(f"Iteration {len(expanded_graph)}: Added {len(candidates)} ASes, max_connections {max_connections}, total links {total_links}, total nodes {len(expanded_graph)}")
+        print(f"Iteration {len(expanded_asns)}: Added {len(candidates)} ASes, max_connections {cur_max_connections}, total links {total_links // 2}, total nodes {len(expanded_asns)}")
     
     # Ensure final output only contains edges with nodes in the expanded graph
-    valid_nodes = set(expanded_graph.keys())
-    for asn in expanded_graph:
-        expanded_graph[asn] = {neighbor for neighbor in expanded_graph[asn] if neighbor in valid_nodes}
+    expanded_graph = {
+        asn: {neighbor for neighbor in graph[asn] if neighbor in expanded_asns}
+        for asn in expanded_asns
+    }
     
     # Collect country codes of final topology
     final_countries = {as_numbers[asn] for asn in expanded_graph if asn in as_numbers}
@@ -105,8 +104,9 @@ def main():
     args = parser.parse_args()
     
     region_filter = set(args.regions.split(","))
-    as_numbers = load_as_list(args.as_list_path, region_filter)
-    graph = load_as_relationships(args.as_rel_path)
+    dataset = load_caida_dataset(args.as_list_path, args.as_rel_path)
+    as_numbers = dataset.get_as_countries()
+    graph = dataset.get_as_graph()
     expanded_graph = expand_topology(graph, as_numbers, args.target_count, region_filter)
     save_expanded_topology(expanded_graph, args.output_path)
 
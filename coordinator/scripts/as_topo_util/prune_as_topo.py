@@ -1,61 +1,54 @@
-import json
-import heapq
 import argparse
 from collections import defaultdict
+from caida_cache import load_caida_dataset
 
-def load_as_list(as_list_path):
-    """Load AS numbers from the AS list JSONL file."""
-    as_numbers = set()
-    with open(as_list_path, 'r') as file:
-        for line in file:
-            data = json.loads(line)
-            as_numbers.add(data["asn"])
-    return as_numbers
+def prune_topology(graph, target_count, exact=False):
+    """Iteratively remove nodes until the topology has the target AS count.
 
-def load_as_relationships(as_rel_path, as_numbers):
-    """Load AS relationships from the relationship file, ignoring comments."""
-    graph = defaultdict(set)
-    with open(as_rel_path, 'r') as file:
-        for line in file:
-            line = line.strip()
-            if not line or line.startswith("#"):
-                continue  # Ignore comment lines
-            parts = line.split("|")
-            if len(parts) != 3:
-                continue  # Ignore malformed lines
-            as1, as2 = parts[0], parts[1]
-            if as1 in as_numbers and as2 in as_numbers:
-                graph[as1].add(as2)
-                graph[as2].add(as1)
-    return graph
+    Each iteration removes all leaf nodes (nodes with only one connection) at
+    once, or all nodes with the lowest degree if there is no leaf. Nodes are
+    kept in buckets by degree, which are updated as their neighbors are
+    removed, so no iteration scans the whole graph. With exact set, the last
+    iteration stops as soon as the target AS count is reached.
+    """
+    degree_buckets = defaultdict(dict) # Degree -> nodes, used as an ordered set
+    for asn, neighbors in graph.items():
+        degree_buckets[len(neighbors)][asn] = None
+    min_degree = min(degree_buckets) if degree_buckets else 0
+    asn_positions = {asn: i for i, asn in enumerate(graph)} if exact else None
+
+    def remove_node(node):
+        nonlocal min_degree
+        del degree_buckets[len(graph[node])][node]
+        for neighbor in graph.pop(node):
+            if neighbor == node:
+                continue
+            degree = len(graph[neighbor])
+            del degree_buckets[degree][neighbor]
+            graph[neighbor].discard(node) # Remove node from its neighbors
+            degree_buckets[degree - 1][neighbor] = None
+            min_degree = min(min_degree, degree - 1)
 
-def prune_topology(graph, target_count):
-    """Iteratively remove nodes until the topology has the target AS count."""
     iteration = 0
     while len(graph) > target_count:
         iteration += 1
-        # Identify leaf nodes (nodes with only one connection)
-        leaf_nodes = [asn for asn, neighbors in graph.items() if len(neighbors) == 1]
-        pruned_count = len(leaf_nodes)
-        min_degree = min(len(neighbors) for neighbors in graph.values()) if graph else 0
-        
-        if leaf_nodes:
-            for leaf in leaf_nodes:
-                if leaf in graph:
-                    neighbor = next(iter(graph[leaf]))  # Get the single neighbor
-                    graph[neighbor].discard(leaf)  # Remove leaf from its neighbor
-                    del graph[leaf]  # Remove leaf node itself
+        while not degree_buckets[min_degree]:
+            min_degree += 1
+        cur_min_degree = min_degree
+
+        # Remove leaf nodes if any, otherwise nodes with the lowest degree
+        if degree_buckets[1]:
+            pruned_nodes = list(degree_buckets[1])
         else:
-            # If no leaf nodes, remove nodes with the lowest degree
-            low_degree_nodes = [asn for asn, neighbors in graph.items() if len(neighbors) == min_degree]
-            pruned_count = len(low_degree_nodes)
-            
-            for node in low_degree_nodes:
-                for neighbor in graph[node]:
-                    graph[neighbor].discard(node)  # Remove node from its neighbors
-                del graph[node]  # Remove node itself
-        
-        print(f"Iteration {iteration}: Pruned {pruned_count} nodes, lowest degree {min_degree}, remaining {len(graph)} nodes")
+            pruned_nodes = list(degree_buckets[min_degree])
+        if exact:
+            pruned_nodes.sort(key=asn_positions.__getitem__)
+            pruned_nodes = pruned_nodes[:len(graph) - target_count]
+
+        for node in pruned_nodes:
+            remove_node(node)
+
+        print(f"Iteration {iteration}: Pruned {len(pruned_nodes)} nodes, lowest degree {cur_min_degree}, remaining {len(graph)} nodes")
     
     return graph
 
@@ -74,11 +67,13 @@ def main():
     parser.add_argument("as_rel_path", type=str, help="Path to the AS relationship file")
     parser.add_argument("output_path", type=str, help="Path to save the pruned topology")
     parser.add_argument("target_count", type=int, help="Target AS count after pruning")
+    parser.add_argument("--exact", action="store_true", help="Stop exactly at the target AS count")
     args = parser.parse_args()
     
-    as_numbers = load_as_list(args.as_list_path)
-    graph = load_as_relationships(args.as_rel_path, as_numbers)
-    pruned_graph = prune_topology(graph, args.target_count)
+    # Only relationships between ASes in the AS list are kept
+    dataset = load_caida_dataset(args.as_list_path, args.as_rel_path)
+    graph = dataset.get_as_graph(listed_only=True)
+    pruned_graph = prune_topology(graph, args.target_count, args.exact)
     save_pruned_topology(pruned_graph, args.output_path)
 
 if __name__ == "__main__":
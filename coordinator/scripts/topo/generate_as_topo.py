@@ -4,21 +4,18 @@
 # 2 large: TW,MO,AF,AM,AU,AZ,BD,BN,BT,CN,FJ,HK,IN,ID,JP,KH,KP,KR,LA,MG,MM,MN,NP,NZ,PH,SG,LK,TH,TL,VN
 
 import os
-import json
-import argparse
+import sys
 import shutil
+import argparse
 
-COORDINATOR_WORKDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
-AS_DATA_DIR = os.path.join(COORDINATOR_WORKDIR, "data")
-AS_TOPO_CONFIG_FILEPATH = os.path.join(AS_DATA_DIR, "as_topo_config.json")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from util.topo_gen import get_as_topo_data_filepath
 
 def generate_as_topology(size, filepath):
-    with open(AS_TOPO_CONFIG_FILEPATH, 'r') as f:
-        as_topo_config = json.load(f)
     try:
-        src_filepath = os.path.join(AS_DATA_DIR, as_topo_config[size])
-    except KeyError:
-        print(f"Invalid size: {size}")
+        src_filepath = get_as_topo_data_filepath(size)
+    except ValueError as e:
+        print(e)
         exit(1)
     dst_filepath = filepath
     shutil.copy(src_filepath, dst_filepath)
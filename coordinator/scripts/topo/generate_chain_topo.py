@@ -1,22 +1,14 @@
+import os
+import sys
 import argparse
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from util.topo_gen import generate_chain_topo
+from util.mvs.partition.fmt_util import write_topo_to_file
 
-def generate_chain_topology(n, filepath):
-    nodes = []
-    edges = []
 
-    # Generate nodes
-    for i in range(n):
-        nodes.append(i + 1)
-        if i > 0:
-            edges.append((i, i + 1))
-    # Write nodes and edges to the output file
-    with open(filepath, 'w') as f:
-        # Write nodes
-        f.write(' '.join(map(str, nodes)) + '\n')
-        # Write edges
-        for edge in edges:
-            f.write(f"{edge[0]} {edge[1]}\n")
+def generate_chain_topology(n, filepath):
+    write_topo_to_file(filepath, *generate_chain_topo(n))
 
 
 if __name__ == "__main__":
@@ -1,47 +1,14 @@
+import os
+import sys
 import argparse
 
-def generate_grid_topology(x, y, filepath):
-    nodes = []
-    edges = []
-
-    # Generate nodes in the grid
-    for i in range(x):
-        for j in range(y):
-            node_id = i * y + j + 1  # Node indexing starts at 1
-            nodes.append(node_id)
-
-    # Generate edges within the grid, considering marginal cases where x or y might be 1
-    for i in range(x):
-        for j in range(y):
-            node_id = i * y + j + 1
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from util.topo_gen import generate_grid_topo
+from util.mvs.partition.fmt_util import write_topo_to_file
 
-            # Connect to the right neighbor, wrap around if y > 1
-            if y > 1:
-                if j < y - 1:
-                    right_neighbor = node_id + 1
-                    edges.append((node_id, right_neighbor))
-                else:
-                    # Connect the right boundary to the left boundary (wrap around)
-                    left_neighbor = node_id - (y - 1)
-                    edges.append((node_id, left_neighbor))
 
-            # Connect to the bottom neighbor, wrap around if x > 1
-            if x > 1:
-                if i < x - 1:
-                    bottom_neighbor = node_id + y
-                    edges.append((node_id, bottom_neighbor))
-                else:
-                    # Connect the bottom boundary to the top boundary (wrap around)
-                    top_neighbor = node_id - (x - 1) * y
-                    edges.append((node_id, top_neighbor))
-
-    # Write nodes and edges to the output file
-    with open(filepath, 'w') as f:
-        # Write nodes
-        f.write(' '.join(map(str, nodes)) + '\n')
-        # Write edges
-        for edge in edges:
-            f.write(f"{edge[0]} {edge[1]}\n")
+def generate_grid_topology(x, y, filepath):
+    write_topo_to_file(filepath, *generate_grid_topo(x, y))
 
 
 if __name__ == "__main__":
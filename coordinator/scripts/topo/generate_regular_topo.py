@@ -0,0 +1,27 @@
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from util.topo_gen import generate_regular_topo_chunks
+from util.mvs.partition.fmt_util import write_topo_chunks_to_file
+
+def generate_regular_topology(n, d, seed, filepath):
+    write_topo_chunks_to_file(filepath, *generate_regular_topo_chunks(n, d, seed))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='A script to generate random regular topology')
+    parser.add_argument('n', type=int, help='Node number')
+    parser.add_argument('d', type=int, help='Degree of each node')
+    parser.add_argument('seed', type=int, help='Random seed')
+    parser.add_argument('filepath', type=str, help='Output file name')
+    args = parser.parse_args()
+
+    n = args.n
+    d = args.d
+    seed = args.seed
+    filepath = args.filepath
+
+    generate_regular_topology(n, d, seed, filepath)
+    print(f"Random regular topology generated in {filepath}.")
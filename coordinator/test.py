@@ -20,7 +20,9 @@ from util.mns import *
 from util.common import *
 from util.remote import *
 from util.topo_util import *
+from util.topo_cache import *
 from util.factor import *
+from util.prefetch import *
 
 ############################ Constants ###############################
 
@@ -111,6 +113,11 @@ var_options = {
         # ["clos", "28"],
         # ["clos", "32"],
 
+        # ["ba", "100000", "2", "1"],
+        # ["ba", "1000000", "2", "1"],
+        # ["waxman", "100000", "4", "1"],
+        # ["regular", "100000", "4", "1"],
+
         # ["chain", "1251"],
         # ["chain", "2501"],
         # ["chain", "3751"],
@@ -363,41 +370,59 @@ def output_mem_usage_to_file(
 
 ###################### One run of the experiment #########################
 
-def one_test(var_opts, remote_pms, local_result_repo_dir, pm_config_list, exp_config):
+def is_test_completed(var_opts, local_result_repo_dir):
+    full_cur_test_log_dir = os.path.join(local_result_repo_dir, get_one_test_log_name(var_opts))
+    return os.path.exists(full_cur_test_log_dir) and os.listdir(full_cur_test_log_dir)
+
+def load_test_inputs(topo, pm_config_list, exp_config, log_file=None):
+    """Generates the graph of a topology and partitions it across PMs.
+
+    Neither depends on the VMs of a test, so the inputs of the next test can
+    be prefetched while the current one is running. Messages are printed to
+    log_file (stdout by default).
+    """
+    topo = list(topo)
+    full_topo_filepath = get_full_topo_filepath(topo, LOCAL_TOPO_DIR)
+    graph = generate_topo_graph(topo, log_file=log_file)
+
+    # Partition topo to PMs
+    print(f"Partitioning across all PMs...", file=log_file)
+    cur_ts = time.time()
+    cross_pm_partition_method = exp_config["CrossPMPartitioning"]
+    node2pmid, pmid2graph = partition_graph_across_pm(
+        cross_pm_partition_method,
+        graph, pm_config_list, full_topo_filepath,
+        exp_config.get("METISEnsembleSize", 1), log_file)
+    cross_pm_partition_time = time.time() - cur_ts
+    print(f"Cross-PM partitioning elapsed for {cross_pm_partition_time}s", file=log_file)
+    return graph, node2pmid, pmid2graph
+
+def one_test(var_opts, remote_pms, local_result_repo_dir, pm_config_list, exp_config,
+             prefetcher, next_var_opts=None):
     # Check log directory of current test
     print(f"\n\n============== New test! Options: {var_opts} ==============\n")
     test_start_ts = time.time()
     final_cur_test_log_dir = get_one_test_log_name(var_opts)
     full_cur_test_log_dir = os.path.join(local_result_repo_dir, final_cur_test_log_dir)
-    if os.path.exists(full_cur_test_log_dir) and os.listdir(full_cur_test_log_dir):
+    if is_test_completed(var_opts, local_result_repo_dir):
         print(f"Test {var_opts} skipped")
         return # Current test has been completed before, skip current iteration
     os.makedirs(full_cur_test_log_dir, exist_ok=True)
 
-    # Generate current topology
+    # Generate current topology and partition it to PMs, unless prefetched
     topo = var_opts['t']
-    full_topo_filepath = generate_topo(topo, LOCAL_TOPO_DIR)
-
-    # Partition topo to PMs
-    print(f"Partitioning across all PMs...")
-    cur_ts = time.time()
-    nodes, adjacency_list = read_graph_from_topo_file(full_topo_filepath)
-    cross_pm_partition_method = exp_config["CrossPMPartitioning"]
-    node2pmid, pmid2nodes, pmid2adjacencylist = partition_graph_across_pm(
-        cross_pm_partition_method,
-        nodes, adjacency_list,
-        pm_config_list, full_topo_filepath)
-    cross_pm_partition_time = time.time() - cur_ts
-    print(f"Cross-PM partitioning elapsed for {cross_pm_partition_time}s")
+    full_topo_filepath = get_full_topo_filepath(topo, LOCAL_TOPO_DIR)
+    graph, node2pmid, pmid2graph = prefetcher.get(tuple(topo))
 
     # Get the optimal VM allocation for each PM in parallel
     print(f"Planning optimal VM configuration...")
     cur_ts = time.time()
     pmid2search_results, pmid2vmalloc, n_opt_legal = \
         get_optimal_vm_allocation_for_all_pms(
-            pmid2nodes, pmid2adjacencylist,
+            pmid2graph,
             pm_config_list, exp_config,
-            FIXED_VM_NUM_PER_PM, FIXED_M_CONF, FIXED_BBNS_NUM
+            FIXED_VM_NUM_PER_PM, FIXED_M_CONF, FIXED_BBNS_NUM,
+            '_'.join(topo)
         )
     if not all(n_opt_legal.values()):
         print(f"Warning: Optimal VM number exceeds maximum VM number on some PMs. Skipping current test.")
@@ -424,6 +449,10 @@ def one_test(var_opts, remote_pms, local_result_repo_dir, pm_config_list, exp_co
     cross_vm_partition_time = time.time() - cur_ts
     print(f"Cross-VM partitioning elapsed for {cross_vm_partition_time}s")
 
+    # Prepare inputs of the next test while VMs boot and agents run
+    if next_var_opts is not None:
+        prefetcher.prefetch(tuple(next_var_opts['t']))
+
     # Start VMs on all PMs
     print(f"Starting VMs...")
     cur_ts = time.time()
@@ -450,9 +479,12 @@ def one_test(var_opts, remote_pms, local_result_repo_dir, pm_config_list, exp_co
 
     # Partition the topology to VMs
     tdf = partition_topo_across_vms_for_all_pms(
-        nodes, adjacency_list,
-        pmid2nodes, pmid2adjacencylist,
-        vm_config_list, full_topo_filepath)
+        graph, pmid2graph,
+        vm_config_list, full_topo_filepath,
+        exp_config.get("SubTopoFormat", "text"),
+        exp_config.get("VMPartitionBalance", "nodes"),
+        pm_config_list, exp_config.get("VMRefineTimeBudget(s)", 0),
+        exp_config.get("METISEnsembleSize", 1))
     tdf_filepath = os.path.join(full_cur_test_log_dir, "tdf.txt")
     output_tdf_to_file(tdf, tdf_filepath)
 
@@ -521,11 +553,20 @@ def run_all_tests(local_result_repo_dir, pm_config_list, exp_config):
     var_opt_keys = var_options.keys()
 
     # Each combination of options is a test
-    for var_opt_comb in product(*var_options.values()):
-        # Get a combination of options
-        opts = dict(zip(var_opt_keys, var_opt_comb))
-        var_opts = deepcopy(opts)
-        one_test(var_opts, remote_pms, local_result_repo_dir, pm_config_list, exp_config)
+    all_var_opts = [dict(zip(var_opt_keys, var_opt_comb)) for var_opt_comb in product(*var_options.values())]
+
+    # Topology graphs and cross-PM partitions are loaded by a background worker
+    def load(topo, log_file):
+        return load_test_inputs(topo, pm_config_list, exp_config, log_file)
+    with Prefetcher(load) as prefetcher:
+        for i, opts in enumerate(all_var_opts):
+            # Get a combination of options, and the next one to be run
+            var_opts = deepcopy(opts)
+            next_var_opts = next((
+                next_opts for next_opts in all_var_opts[i + 1:]
+                if not is_test_completed(next_opts, local_result_repo_dir)), None)
+            one_test(var_opts, remote_pms, local_result_repo_dir, pm_config_list, exp_config,
+                     prefetcher, next_var_opts)
 
     # Close connection to PMs
     for remote_machine in remote_pms:
@@ -1,6 +1,5 @@
 import math
 from .topo_util import *
-from .common import count_lines_islice
 
 def get_bbns_num_for_all_vms(topo, pm_config_list, vm_config_list, FIXED_BBNS_NUM):
     serverid2bbnsnum = {}
@@ -12,8 +11,7 @@ def get_bbns_num_for_all_vms(topo, pm_config_list, vm_config_list, FIXED_BBNS_NU
 
         sub_topo_filename = get_sub_topo_filename(topo, server_id)
         sub_topo_filepath = os.path.join(LOCAL_TOPO_DIR, sub_topo_filename)
-        line_num = count_lines_islice(sub_topo_filepath)
-        link_num = line_num - 1
+        link_num = get_topo_link_num(sub_topo_filepath)
 
         if FIXED_BBNS_NUM == 0:
             k_opt = math.sqrt((link_num * Y) / (2 * X))
@@ -0,0 +1,97 @@
+import os
+import json
+import fcntl
+import hashlib
+import threading
+from .partition.graph import CSRGraph
+
+COORDINATOR_WORKDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+EMAX_MEMO_DIR = os.path.join(COORDINATOR_WORKDIR, "emax_memo")
+
+# Bump when the partition stats of an entry change for the same graph, n, method and seed
+EMAX_MEMO_FORMAT_VERSION = 1
+
+_memo_lock = threading.Lock()
+
+
+#####################################
+# Keys of memoized partition stats  #
+#####################################
+
+def _compute_graph_hash(graph):
+    hasher = hashlib.sha256(f"v{EMAX_MEMO_FORMAT_VERSION}:".encode())
+    hasher.update(graph.xadj.tobytes())
+    hasher.update(graph.adjncy.tobytes())
+    # Cross-partition links are counted on the end whose name sorts first
+    hasher.update(graph.get_derived("name_ranks", CSRGraph.name_ranks).tobytes())
+    return hasher.hexdigest()[:32]
+
+def get_graph_hash(graph):
+    """Hash of the structure and node name order of a graph, which is all that partition stats depend on."""
+    return graph.get_derived("graph_hash", _compute_graph_hash)
+
+def get_memo_filepath(graph_hash, memo_dir=EMAX_MEMO_DIR):
+    return os.path.join(memo_dir, f"{graph_hash}.json")
+
+def _get_seed_key(seed):
+    return "default" if seed is None else str(seed)
+
+
+##################################
+# Store and load partition stats #
+##################################
+
+def _read_memo_file(memo_filepath):
+    if not os.path.exists(memo_filepath):
+        return None
+    with open(memo_filepath, 'r') as f:
+        memo = json.load(f)
+    return memo if memo.get("version") == EMAX_MEMO_FORMAT_VERSION else None
+
+def load_E_max_memo(graph, method="metis", seed=None, memo_dir=EMAX_MEMO_DIR):
+    """Memoized partition stats of the graph as {n: stats}, empty if there are none."""
+    memo = _read_memo_file(get_memo_filepath(get_graph_hash(graph), memo_dir))
+    if memo is None:
+        return {}
+    n2stats = memo["entries"].get(method, {}).get(_get_seed_key(seed), {})
+    return {int(n): stats for n, stats in n2stats.items()}
+
+def save_E_max_memo(graph, n2stats, method="metis", seed=None, label=None, memo_dir=EMAX_MEMO_DIR):
+    """Merges {n: stats} into the memo of the graph, written atomically.
+
+    label names the topology the graph comes from, for dataproc; a graph
+    keeps every label it was saved with.
+    """
+    graph_hash = get_graph_hash(graph)
+    memo_filepath = get_memo_filepath(graph_hash, memo_dir)
+    os.makedirs(memo_dir, exist_ok=True)
+    # The file lock keeps other processes from merging into the memo meanwhile,
+    # the thread lock other threads of this one
+    with _memo_lock, open(f"{memo_filepath}.lock", 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        memo = _read_memo_file(memo_filepath) or {
+            "version": EMAX_MEMO_FORMAT_VERSION,
+            "graph_hash": graph_hash,
+            "node_num": graph.node_num,
+            "link_num": graph.edge_num,
+            "labels": [],
+            "entries": {},
+        }
+        if label is not None and label not in memo["labels"]:
+            memo["labels"].append(label)
+        seed_entries = memo["entries"].setdefault(method, {}).setdefault(_get_seed_key(seed), {})
+        seed_entries.update({str(n): stats for n, stats in n2stats.items()})
+        tmp_filepath = f"{memo_filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_filepath, 'w') as f:
+            json.dump(memo, f, indent=1, sort_keys=True)
+        os.replace(tmp_filepath, memo_filepath)
+
+def iter_E_max_memos(memo_dir=EMAX_MEMO_DIR):
+    """Yields every memo in the store, as written by save_E_max_memo."""
+    if not os.path.isdir(memo_dir):
+        return
+    for filename in sorted(os.listdir(memo_dir)):
+        if filename.endswith(".json"):
+            memo = _read_memo_file(os.path.join(memo_dir, filename))
+            if memo is not None:
+                yield memo
@@ -4,60 +4,263 @@ import time
 import math
 import csv
 import concurrent
+import numpy as np
+from scipy.interpolate import PchipInterpolator
+from .partition.graph import CSRGraph, share_graph, attach_shared_graph
 from .partition.partition_topo_vm import partition_graph_across_vm
+from .partition.algorithm import partition_hierarchy, partition_metis_ensemble, get_ensemble_seeds, LazyMetisExecutor
+from .partition.refine import get_vm_setup_time
+from .emax_memo import get_graph_hash, load_E_max_memo, save_E_max_memo
 
 ################## E_max_n derivation functions ##################
 
-def get_partition_stats(nodes, adjacency_list, node2serverid, n):
-    # Count the number of edges in each partition as well dangling edges
-    partition_stats = {}
-    for _, server_id in node2serverid.items():
-        if server_id not in partition_stats:
-            partition_stats[server_id] = {
-                "node_count": 0,
-                "edge_count": 0,
-                "dangling_edges": 0
-            }
-    # Count nodes in each partition
-    for node in nodes:
-        server_id = node2serverid[node]
-        if server_id in partition_stats:
-            partition_stats[server_id]["node_count"] += 1
-        else:
-            partition_stats[server_id] = {
-                "node_count": 1,
-                "edge_count": 0,
-                "dangling_edges": 0
-            }
-
-    # Count edges in each partition
-    for u in nodes:
-        for v in adjacency_list[u]:
-            if u >= v:
-                continue
-            u_server_id = node2serverid[u]
-            v_server_id = node2serverid[v]
-            if u_server_id == v_server_id:
-                partition_stats[u_server_id]["edge_count"] += 1
-            else:
-                partition_stats[u_server_id]["edge_count"] += 1
-                partition_stats[u_server_id]["edge_count"] += 1
-                partition_stats[u_server_id]["dangling_edges"] += 1
-                partition_stats[v_server_id]["dangling_edges"] += 1
-    # print(partition_stats)
+def get_partition_stats(graph, node2serverid, n):
+    """Per-partition stats of the graph partitioned by node2serverid into n partitions.
+
+    Counts are arrays indexed by partition: nodes, links set up, dangling
+    links, and cut degree (number of other partitions linked to). A
+    cross-partition link adds 2 to the link count of the end whose name
+    sorts first, and none to the other end. Imbalances are max/mean of the
+    node and link counts.
+    """
+    node2serverid = np.asarray(node2serverid)
+    part_num = max(n, int(node2serverid.max()) + 1) if graph.node_num else n
+    # Every link is visited once from each end
+    arc_sources = graph.get_derived("arc_sources", CSRGraph.arc_sources)
+    src_parts = node2serverid[arc_sources]
+    dst_parts = node2serverid[graph.adjncy]
+    is_cut = src_parts != dst_parts
+    name_ranks = graph.get_derived("name_ranks", CSRGraph.name_ranks)
+    is_first_end = name_ranks[arc_sources] < name_ranks[graph.adjncy]
+    dangling_edges = np.bincount(src_parts[is_cut], minlength=part_num)
+    inner_edges = np.bincount(src_parts[~is_cut], minlength=part_num) // 2
+    cut_edges = 2 * np.bincount(src_parts[is_cut & is_first_end], minlength=part_num)
+    part_pairs = np.unique(src_parts[is_cut].astype(np.int64) * part_num + dst_parts[is_cut])
+    partition_stats = {
+        "node_count": np.bincount(node2serverid, minlength=part_num),
+        "edge_count": inner_edges + cut_edges,
+        "dangling_edges": dangling_edges,
+        "cut_degree": np.bincount(part_pairs // part_num, minlength=part_num),
+    }
+    for name, counts in (("node_imbalance", "node_count"), ("edge_imbalance", "edge_count")):
+        mean = partition_stats[counts].mean()
+        partition_stats[name] = float(partition_stats[counts].max() / mean) if mean > 0 else 1.0
     return partition_stats
 
 
-def get_E_max_data_for_pm_topo(nodes, adjacency_list, pm_core_num):
-    E_max_data = {}
-    n_range = range(1, pm_core_num + 1)
-    for n in n_range:
-        # Partition the topology with METIS
-        node2serverid = partition_graph_across_vm(nodes, adjacency_list, n, 0, random=False)
-        partition_stats = get_partition_stats(nodes, adjacency_list, node2serverid, n)
-        max_edge_count = max(partition_stats[server_id]["edge_count"] for server_id in partition_stats)
-        E_max_data[n] = max_edge_count
-    return E_max_data
+def get_E_max_stats_for_vm_num(graph, n, method="metis", ensemble_size=1):
+    """Partition stats of the topology partitioned into n VMs with METIS.
+
+    E_max is the maximum edge count of a VM; the maximum node count of a VM
+    and the number of cross-VM links are kept along. With method "hierarchy"
+    the partition is cut from the recursive bisection order of the graph
+    instead of an n-way METIS run. Methods "metis-<balance>" run METIS with
+    that balance (see get_E_max_method()). With an ensemble_size above 1,
+    METIS runs ensemble_size times (see get_ensemble_seeds()) and the best
+    partition is kept, its seed is kept along (None for the default run).
+    """
+    seed = None
+    ensemble = method != "hierarchy" and ensemble_size > 1
+    if method == "hierarchy":
+        node2serverid = partition_hierarchy(graph, n)
+    else:
+        balance = method.partition("-")[2] or "nodes"
+        if ensemble:
+            node2serverid, seed = partition_metis_ensemble(graph, n, get_ensemble_seeds(ensemble_size), balance)
+        else:
+            node2serverid = partition_graph_across_vm(graph, n, 0, random=False, balance=balance)
+    partition_stats = get_partition_stats(graph, node2serverid, n)
+    stats = {
+        "E_max": int(partition_stats["edge_count"].max()),
+        "max_node_count": int(partition_stats["node_count"].max()),
+        "cut_link_num": int(partition_stats["dangling_edges"].sum()) // 2,
+    }
+    if ensemble:
+        stats["seed"] = seed
+    return stats
+
+def sweep_E_max_stats(graph, n_list, executor=None, method="metis", ensemble_size=1):
+    """Partition stats for each n in n_list, computed in the process pool executor if given.
+
+    METIS is deterministic for a given graph, so the result does not depend
+    on the pool or on the order in which the n are computed. With method
+    "hierarchy" the pool is not used: the bisection tree is built once in
+    the calling thread, and every n is cut from it.
+    """
+    if executor is None or method == "hierarchy":
+        return {n: get_E_max_stats_for_vm_num(graph, n, method, ensemble_size) for n in n_list}
+
+    # Workers map the CSR arrays from shared memory instead of unpickling the graph
+    with share_graph(graph) as shared_graph_info:
+        # Larger n take longer with METIS, start them first
+        futures = {
+            n: executor.submit(
+                _get_E_max_stats_for_vm_num_in_worker, shared_graph_info, n, method, ensemble_size)
+            for n in sorted(n_list, reverse=True)}
+        n2stats = {n: futures[n].result() for n in n_list}
+    return n2stats
+
+def get_E_max_stats(graph, n_list, executor=None, label=None, method="metis", ensemble_size=1):
+    """Partition stats for each n in n_list, and the number of METIS sweeps it took.
+
+    Partition stats are memoized on disk by graph hash, partitioning method
+    and METIS ensemble size, so only the n never partitioned for this graph
+    before go to METIS. label names the topology in the memo.
+    """
+    if method == "hierarchy":
+        ensemble_size = 1
+    # Ensembles include the default METIS run, see get_ensemble_seeds()
+    memo_seed = f"ensemble-of-{ensemble_size}" if ensemble_size > 1 else None
+    n2stats = load_E_max_memo(graph, method, memo_seed)
+    missing_n_list = [n for n in n_list if n not in n2stats]
+    if missing_n_list:
+        n2stats.update(sweep_E_max_stats(graph, missing_n_list, executor, method, ensemble_size))
+        save_E_max_memo(graph, {n: n2stats[n] for n in missing_n_list}, method, memo_seed, label)
+    if n_list:
+        print(f"E_max memo of graph {get_graph_hash(graph)}: "
+              f"{len(n_list) - len(missing_n_list)} of {len(n_list)} values reused")
+    return {n: n2stats[n] for n in n_list}, len(missing_n_list)
+
+def get_E_max_method(exp_config):
+    """Partitioning method of the E_max sweep, which is also the key of its memo.
+
+    E_max(n) is modelled with the balance the VMs are partitioned with, so
+    METIS with another balance than node counts is "metis-<balance>". The
+    hierarchy is always balanced by node count.
+    """
+    method = exp_config.get("EmaxPartitioning", "metis")
+    balance = exp_config.get("VMPartitionBalance", "nodes")
+    if method == "metis" and balance != "nodes":
+        return f"metis-{balance}"
+    return method
+
+def get_E_max_data_for_pm_topo(graph, pm_core_num, executor=None, label=None, method="metis", ensemble_size=1):
+    """E_max(n) for n in 1..pm_core_num."""
+    n2stats, _ = get_E_max_stats(graph, range(1, pm_core_num + 1), executor, label, method, ensemble_size)
+    return {n: stats["E_max"] for n, stats in n2stats.items()}
+
+##### Adaptive E_max sampling #####
+
+# Number of n sampled exactly (geometrically spaced) before refining
+EMAX_ADAPTIVE_INITIAL_SAMPLE_NUM = 8
+# Relative interpolation error under which an interval of n is not refined
+EMAX_ADAPTIVE_REL_TOL = 0.03
+
+def _fit_log_E_max(n_list, E_max_list):
+    # E_max(n) is close to E / n, so the interpolant is fitted in log-log space
+    return PchipInterpolator(np.log(n_list), np.log(np.maximum(E_max_list, 1)))
+
+def interpolate_E_max(n2E_max, n_max):
+    """Estimates E_max(n) for n in 0..n_max from exact values at some n.
+
+    Returns the estimates and their relative error bounds, indexed by n. The
+    interpolant is a PCHIP in log-log space, which is monotone wherever the
+    exact values are. The error bound of n between two sampled values is
+    the leave-one-out error of the interpolant at these values, at least
+    EMAX_ADAPTIVE_REL_TOL; sampled values are exact.
+    """
+    knots = np.array(sorted(n2E_max))
+    values = np.maximum([n2E_max[n] for n in knots], 1).astype(np.float64)
+    n_range = np.arange(n_max + 1)
+    E_max_est = np.exp(_fit_log_E_max(knots, values)(np.log(np.maximum(n_range, 1))))
+
+    # Error of each sampled value when predicted from the others
+    knot_errors = np.zeros(len(knots))
+    for i in range(1, len(knots) - 1):
+        others = np.arange(len(knots)) != i
+        prediction = np.exp(_fit_log_E_max(knots[others], values[others])(np.log(knots[i])))
+        knot_errors[i] = abs(prediction - values[i]) / values[i]
+    if len(knots) > 2:
+        knot_errors[0], knot_errors[-1] = knot_errors[1], knot_errors[-2]
+
+    rel_errors = np.zeros(n_max + 1)
+    for i in range(len(knots) - 1):
+        rel_errors[knots[i] + 1:knots[i + 1]] = max(knot_errors[i], knot_errors[i + 1], EMAX_ADAPTIVE_REL_TOL)
+    return E_max_est, rel_errors
+
+def get_adaptive_E_max_data(
+    graph, pm_core_num, search_n2gain, executor=None, label=None, method="metis", ensemble_size=1):
+    """E_max(n) for n in 1..pm_core_num, with METIS run only where it matters.
+
+    E_max is computed exactly at a few geometrically spaced n and
+    interpolated in between. search_n2gain(E_max) returns the best Gain of
+    each n; each round computes exactly the predicted optimum and its
+    neighbors, and splits every interval holding an n whose Gain could
+    still beat the best exact Gain within the interpolation error bound.
+    Rounds stop when no such n is left, so the optimum is found among exact
+    values, as with a full sweep, and intervals are only refined where
+    their interpolation error could change it.
+
+    Returns E_max(n) for every n (exact or interpolated), the exact n, and
+    the number of METIS sweeps made.
+    """
+    if pm_core_num <= EMAX_ADAPTIVE_INITIAL_SAMPLE_NUM:
+        n2stats, metis_call_num = get_E_max_stats(
+            graph, range(1, pm_core_num + 1), executor, label, method, ensemble_size)
+        return {n: stats["E_max"] for n, stats in n2stats.items()}, list(n2stats), metis_call_num
+
+    n2E_max = {}
+    metis_call_num = 0
+
+    def compute_exact(n_list):
+        nonlocal metis_call_num
+        n_list = sorted(set(n_list) - n2E_max.keys())
+        if not n_list:
+            return 0
+        n2stats, call_num = get_E_max_stats(graph, n_list, executor, label, method, ensemble_size)
+        n2E_max.update({n: stats["E_max"] for n, stats in n2stats.items()})
+        metis_call_num += call_num
+        return len(n_list)
+
+    initial_n_list = np.geomspace(1, pm_core_num, EMAX_ADAPTIVE_INITIAL_SAMPLE_NUM)
+    compute_exact(np.unique(np.round(initial_n_list).astype(int)).tolist())
+
+    while True:
+        E_max_est, rel_errors = interpolate_E_max(n2E_max, pm_core_num)
+        n2gain = search_n2gain(lambda n: E_max_est[n])
+        if not n2gain:
+            break
+        # Gain decreases with E_max(n), so the lowest possible E_max(n) bounds
+        # it; the VMs hold every link at least once, so E_max(n) >= E / n
+        n2gain_bound = search_n2gain(
+            lambda n: max(E_max_est[n] * (1 - rel_errors[n]), graph.edge_num / n))
+        exact_gains = [gain for n, gain in n2gain.items() if n in n2E_max]
+        best_exact_gain = max(exact_gains) if exact_gains else -math.inf
+
+        # Refine around the predicted optimum
+        n_pred = max(n2gain, key=n2gain.get)
+        refined_n_list = [n for n in (n_pred - 1, n_pred, n_pred + 1) if 1 <= n <= pm_core_num]
+        # Split the intervals where an interpolated n may still beat the best
+        # exact n, at their geometric middle, which is strictly inside
+        knots = np.array(sorted(n2E_max))
+        for n, gain_bound in n2gain_bound.items():
+            if gain_bound > best_exact_gain and n not in n2E_max:
+                i = np.searchsorted(knots, n)
+                refined_n_list.append(round(math.sqrt(knots[i - 1] * knots[i])))
+        if not compute_exact(refined_n_list):
+            break
+
+    E_max_est, _ = interpolate_E_max(n2E_max, pm_core_num)
+    E_max_data = {n: n2E_max.get(n, float(E_max_est[n])) for n in range(1, pm_core_num + 1)}
+    return E_max_data, sorted(n2E_max), metis_call_num
+
+##### E_max sweep workers #####
+
+def _get_E_max_stats_for_vm_num_in_worker(shared_graph_info, n, method, ensemble_size):
+    return get_E_max_stats_for_vm_num(attach_shared_graph(shared_graph_info), n, method, ensemble_size)
+
+def get_E_max_worker_num(exp_config):
+    """Number of E_max sweep processes, all master cores unless set in EmaxSweepWorkers."""
+    worker_num = exp_config.get("EmaxSweepWorkers", 0)
+    return worker_num if worker_num > 0 else os.cpu_count()
+
+def create_E_max_executor(exp_config):
+    """Process pool for E_max sweeps, or None to sweep in the calling thread.
+
+    The pool starts with the first n the memo cannot answer.
+    """
+    worker_num = get_E_max_worker_num(exp_config)
+    return LazyMetisExecutor(worker_num) if worker_num > 1 else None
 
 ################## Optimization functions ##################
 
@@ -67,8 +270,8 @@ def T_mvs(n, V, E_max, X, Y, Z):
     return T_mvs_n
 
 def T_sn(n, V, E_max, X, Y, Z):
-    E_max_n = E_max(n)
-    T_sn_n_topo = E_max_n * (V / n * X + Z) + E_max_n * math.sqrt(2 * E_max_n * X * Y)
+    # Every VM is assumed to hold V / n nodes and E_max(n) links
+    T_sn_n_topo = get_vm_setup_time(V / n, E_max(n), X, Y, Z)
     return T_sn_n_topo
 
 def M_mvs(n, m_conf, Theta):
@@ -90,9 +293,10 @@ def Gain_sn(n, m_conf, V, E_max, X, Y, Z, Theta, m_req):
     return gain_sn
 
 def get_optimal_vm_allocation_for_pm(
-    pmid, nodes, adjacency_list,
+    pmid, graph,
     pm_config, exp_config,
-    FIXED_VM_NUM, FIXED_M_CONF, FIXED_BBNS_NUM):
+    FIXED_VM_NUM, FIXED_M_CONF, FIXED_BBNS_NUM,
+    E_max_executor=None, topo_label=None):
 
     # Parse the PM config
     pm_core_num = pm_config["coreNum"]
@@ -115,12 +319,6 @@ def get_optimal_vm_allocation_for_pm(
     #     m_conf = min(theta_m_conf_table.keys(), key=lambda x: abs(x - m_req / FIXED_VM_NUM))
     #     return search_results, (FIXED_VM_NUM, m_conf, min(4, int(pm_core_num / FIXED_VM_NUM)))
 
-    # Get the V and E_max(n) for the topology
-    V = len(nodes)
-    E_max_data = get_E_max_data_for_pm_topo(nodes, adjacency_list, pm_core_num)
-    print(f"E_max data for pm #{pmid}: {E_max_data}")
-    E_max = lambda n: E_max_data[n]
-
     # Setup the T and M models and Gain computation functions
     # T_mvs = lambda n, V, E_max: compute_T_mvs(n, V, E_max, X, Y, Z)
     # T_sn = lambda n, V, E_max: compute_T_sn(n, V, E_max, X, Y, Z)
@@ -128,60 +326,102 @@ def get_optimal_vm_allocation_for_pm(
     # Gain_mvs = lambda n, m_conf: compute_gain_mvs(n, m_conf, T_mvs, M_mvs, m_req)
     # Gain_sn = lambda n, m_conf: compute_gain_sn(n, m_conf, T_sn, M_mvs, m_req)
     Gain = Gain_sn if FIXED_BBNS_NUM == 0 else Gain_mvs
+    V = graph.node_num
 
     # Search for the optimal n and m_conf value that maximizes Gain
-    n_opt = 1
-    m_conf_opt = 8
-    m_extra_opt = n_opt * Theta(m_conf_opt)
-    # max_gain = Gain(n_opt, m_conf_opt, V, E_max, X, Y, Z, Theta, m_req)
-    max_gain = -1
-    search_n_range = range(1, pm_core_num)
-    search_m_conf_range = list(theta_m_conf_table.keys())
-    search_results = []
-    for n in search_n_range:
-        for m_conf in search_m_conf_range:
-            # If violating constraints, exclude this value pair
-            if n * m_conf < m_req or n * m_conf > m_platform:
-                continue
-            gain = Gain(n, m_conf, V, E_max, X, Y, Z, Theta, m_req)
-            m_extra = n * Theta(m_conf)
-            search_results.append((n, m_conf, m_extra, gain))
-            # If n or m are fixed, skip as demanded
-            if FIXED_VM_NUM > 0 and n != FIXED_VM_NUM:
-                continue
-            if FIXED_M_CONF > 0 and m_conf != FIXED_M_CONF:
-                continue
-            if gain > max_gain:
-                max_gain = gain
-                n_opt = n
-                m_conf_opt = m_conf
-                m_extra_opt = m_extra
+    def search(E_max):
+        n_opt = 1
+        m_conf_opt = 8
+        m_extra_opt = n_opt * Theta(m_conf_opt)
+        # max_gain = Gain(n_opt, m_conf_opt, V, E_max, X, Y, Z, Theta, m_req)
+        max_gain = -1
+        search_n_range = range(1, pm_core_num)
+        search_m_conf_range = list(theta_m_conf_table.keys())
+        search_results = []
+        n2max_gain = {}
+        for n in search_n_range:
+            for m_conf in search_m_conf_range:
+                # If violating constraints, exclude this value pair
+                if n * m_conf < m_req or n * m_conf > m_platform:
+                    continue
+                gain = Gain(n, m_conf, V, E_max, X, Y, Z, Theta, m_req)
+                m_extra = n * Theta(m_conf)
+                search_results.append((n, m_conf, m_extra, gain))
+                # If n or m are fixed, skip as demanded
+                if FIXED_VM_NUM > 0 and n != FIXED_VM_NUM:
+                    continue
+                if FIXED_M_CONF > 0 and m_conf != FIXED_M_CONF:
+                    continue
+                n2max_gain[n] = max(n2max_gain.get(n, -math.inf), gain)
+                if gain > max_gain:
+                    max_gain = gain
+                    n_opt = n
+                    m_conf_opt = m_conf
+                    m_extra_opt = m_extra
+        return search_results, n_opt, m_conf_opt, n2max_gain
+
+    # Get E_max(n) for the topology, exactly or only around the optimum,
+    # from n-way METIS runs or from one bisection tree ("hierarchy")
+    E_max_method = get_E_max_method(exp_config)
+    ensemble_size = exp_config.get("METISEnsembleSize", 1)
+    if exp_config.get("EmaxSampling", "exact") == "adaptive":
+        E_max_data, exact_n_list, metis_call_num = get_adaptive_E_max_data(
+            graph, pm_core_num, lambda E_max: search(E_max)[3],
+            E_max_executor, topo_label, E_max_method, ensemble_size)
+        exact_E_max_data = {n: E_max_data[n] for n in exact_n_list}
+        print(f"E_max data for pm #{pmid}: {exact_E_max_data}")
+        print(f"Interpolated E_max data for pm #{pmid}: {E_max_data}")
+    else:
+        n2stats, metis_call_num = get_E_max_stats(
+            graph, range(1, pm_core_num + 1), E_max_executor, topo_label, E_max_method, ensemble_size)
+        E_max_data = {n: stats["E_max"] for n, stats in n2stats.items()}
+        print(f"E_max data for pm #{pmid}: {E_max_data}")
+    print(f"Exact E_max computations for pm #{pmid}: {metis_call_num} partitions with {E_max_method}")
+    E_max = lambda n: E_max_data[n]
+
+    search_results, n_opt, m_conf_opt, _ = search(E_max)
     vcpu_num_opt = min(8, int(pm_core_num / n_opt))
     optimal_result = (n_opt, m_conf_opt, vcpu_num_opt)
     return search_results, optimal_result
 
+def get_pm_topo_label(topo_name, pmid, pm_num):
+    """Name of the part of a topology on a PM, as labelled in the E_max memo."""
+    if topo_name is None or pm_num == 1:
+        return topo_name
+    return f"{topo_name}--pm-{pmid}-of-{pm_num}"
+
 def get_optimal_vm_allocation_for_all_pms(
-    pmid2nodes, pmid2adjacencylist,
+    pmid2graph,
     pm_config_list, exp_config,
-    FIXED_VM_NUM_PER_PM, FIXED_M_CONF, FIXED_BBNS_NUM):
+    FIXED_VM_NUM_PER_PM, FIXED_M_CONF, FIXED_BBNS_NUM,
+    topo_name=None):
 
     # Get maximum VM number on each VM
     pmid2search_results = {}
     pmid2vmalloc = {}
     n_opt_legal = {}
 
+    # All PMs share one process pool for their E_max sweeps, so its workers
+    # are divided across PMs as their tasks come in
     def compute_vm_allocation(pmid):
         search_results, optimal_result = get_optimal_vm_allocation_for_pm(
-            pmid, pmid2nodes[pmid], pmid2adjacencylist[pmid],
+            pmid, pmid2graph[pmid],
             pm_config_list[pmid], exp_config,
-            FIXED_VM_NUM_PER_PM, FIXED_M_CONF, FIXED_BBNS_NUM
+            FIXED_VM_NUM_PER_PM, FIXED_M_CONF, FIXED_BBNS_NUM,
+            E_max_executor, get_pm_topo_label(topo_name, pmid, len(pm_config_list))
         )
+        pmid2graph.release(pmid)  # Cut out again when partitioning VMs
         n_opt, M_conf_opt, vcpu_num_opt = optimal_result
         legal = n_opt <= pm_config_list[pmid]["maxVMNum"]
         return pmid, search_results, optimal_result, legal
 
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        results = list(executor.map(compute_vm_allocation, pmid2nodes.keys()))
+    E_max_executor = create_E_max_executor(exp_config)
+    try:
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            results = list(executor.map(compute_vm_allocation, pmid2graph.keys()))
+    finally:
+        if E_max_executor is not None:
+            E_max_executor.shutdown()
     for pmid, search_results, vmalloc, legal in results:
         pmid2search_results[pmid] = search_results
         pmid2vmalloc[pmid] = vmalloc
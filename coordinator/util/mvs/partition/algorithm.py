@@ -3,63 +3,84 @@ import metis
 import shutil
 import argparse
 import subprocess
-import metis
 import numpy as np
-import random
 import time
+import threading
+import multiprocessing
+import concurrent.futures
 from .fmt_convert import *
+from .graph import attach_shared_graph, share_graph
+from .refine import get_vm_loads
+from .compute_tdf import compute_tdf
 
 ########################## Naive Partitioning ##########################
 
 def partition_naive(
-    nodes, num_partitions):
+    graph, num_partitions):
 
     "Random Partitioning"
 
-    node2pmid = {}
-    for node in nodes:
-        node2pmid[node] = random.randint(0, num_partitions - 1)
-
-    return node2pmid
+    return np.random.randint(0, num_partitions, size=graph.node_num).astype(np.int32)
 
 ########################## METIS Partitioning ##########################
 
-def create_metis_adjacency_list(nodes, adjacency_list):
-    """Converts the adjacency list to METIS format where indices must be contiguous."""
-    node_to_index = {node: idx for idx, node in enumerate(nodes)}
-    index_to_node = {idx: node for node, idx in node_to_index.items()}
-    metis_adjacency_list = []
+# Loads balanced by METIS across parts: node count, link count (node
+# degree), or both as two constraints
+PARTITION_BALANCES = ["nodes", "edges", "nodes+edges"]
+
+def get_vertex_weights(graph, balance="nodes"):
+    """METIS (ncon, vwgt) of the graph for the given balance, vwgt is None for node counts.
 
-    start_time = time.time()
-    neighbor_count = 0
-    for node in nodes:
-        # Convert the node's neighbors from IDs to indices
-        # neighbors_with_weight = [(node_to_index[neighbor], 1) for neighbor in adjacency_list[node]]  # Add default weight 1
-        # metis_adjacency_list.append(neighbors_with_weight)
-        neighbors = [node_to_index[neighbor] for neighbor in adjacency_list[node]]  # Add default weight 1
-        metis_adjacency_list.append(neighbors)
-        neighbor_count += 1
-        # if neighbor_count % 1000 == 0:
-        #     print(f"Neighbor count: {neighbor_count}")
-    # print("Adjacency list conversion completed. Time-cost: ", time.time() - start_time)
+    A node's link load is its degree, so a cross-part link weighs on both
+    of its parts, as it is set up on both sides.
+    """
+    if balance == "nodes":
+        return 1, None
+    # Isolated nodes still cost a container
+    degrees = np.maximum(graph.degrees(), 1)
+    if balance == "edges":
+        return 1, degrees
+    if balance == "nodes+edges":
+        return 2, np.column_stack((np.ones_like(degrees), degrees)).ravel()
+    raise ValueError(f"Unknown partition balance {balance}, expected one of {PARTITION_BALANCES}")
 
-    return metis_adjacency_list, node_to_index, index_to_node
+def create_metis_graph(graph, balance="nodes"):
+    """Copies the CSR arrays of the graph, and its vertex weights for the balance, into a METIS graph."""
+    idx_dtype = np.dtype(metis.idx_t)
+    xadj = np.ascontiguousarray(graph.xadj, dtype=idx_dtype)
+    adjncy = np.ascontiguousarray(graph.adjncy, dtype=idx_dtype)
+    ncon, vwgt = get_vertex_weights(graph, balance)
+    if vwgt is not None:
+        vwgt = np.ascontiguousarray(vwgt, dtype=idx_dtype)
+        vwgt = (metis.idx_t * len(vwgt)).from_buffer_copy(vwgt)
+    return metis.METIS_Graph(
+        nvtxs=metis.idx_t(graph.node_num), ncon=metis.idx_t(ncon),
+        xadj=(metis.idx_t * len(xadj)).from_buffer_copy(xadj),
+        adjncy=(metis.idx_t * len(adjncy)).from_buffer_copy(adjncy),
+        vwgt=vwgt, vsize=None, adjwgt=None)
 
+def get_metis_graph(graph, balance="nodes"):
+    """METIS graph of the graph, created once per balance and reused by every METIS call on it."""
+    if balance == "nodes":
+        return graph.get_derived("metis_graph", create_metis_graph)
+    return graph.get_derived(f"metis_graph-{balance}", lambda graph: create_metis_graph(graph, balance))
 
 def partition_metis(
-    nodes, adjacency_list, num_partitions, random=False):
+    graph, num_partitions, random=False, balance="nodes", seed=None):
     
-    """Partitions the graph into num_partitions using METIS and writes each subgraph."""
-    node2serverid = {}
+    """Partitions the graph into num_partitions using METIS, returns the part of each node.
+
+    balance selects the loads kept even across parts, see PARTITION_BALANCES.
+    seed, if given, is the METIS seed, so the partition can be reproduced;
+    without it METIS runs with its default options. random draws a new
+    seed for each attempt instead, and is the only mode retried when METIS
+    rejects its input: with a fixed seed the error is raised.
+    """
     if num_partitions == 1:
-        server_id = 0
-        for node in nodes:
-            node2serverid[node] = 0
-        return node2serverid
+        return np.zeros(graph.node_num, dtype=np.int32)
 
-    # Convert adjacency list to METIS format with correct indices
-    start_time = time.time()
-    metis_adjacency_list, node_to_index, index_to_node = create_metis_adjacency_list(nodes, adjacency_list)
+    # The METIS graph is only read by METIS, so it is shared between calls
+    metis_graph = get_metis_graph(graph, balance)
 
     # Partition the graph into num_partitions parts using METIS
     # print("Calling metis.part_graph...")
@@ -68,23 +89,154 @@ def partition_metis(
         try:
             if random:
                 # Generate an random integer as seed
-                seed = int(np.random.randint(0, 100))
-                _, parts = metis.part_graph(metis_adjacency_list, nparts=num_partitions, niter=20, recursive=True, seed=seed)
+                random_seed = int(np.random.randint(0, 100))
+                _, parts = metis.part_graph(
+                    metis_graph, nparts=num_partitions, niter=20, recursive=True, seed=random_seed)
+            elif seed is not None:
+                _, parts = metis.part_graph(metis_graph, nparts=num_partitions, seed=seed)
             else:
-                _, parts = metis.part_graph(metis_adjacency_list, nparts=num_partitions)
+                _, parts = metis.part_graph(metis_graph, nparts=num_partitions)
             break
         except metis.METIS_InputError as e:
             print(f"METIS Input Error: {e}")
+            if not random:
+                # The same options would fail the same way
+                raise
             print("Retrying with a different seed...")
             continue
     # print("Partitioning completed. Time-cost: ", time.time() - start_time)
 
-    for idx, part in enumerate(parts):
-        node = index_to_node[idx]  # Convert index back to original node ID
-        server_id = part
-        node2serverid[node] = server_id
+    return np.asarray(parts, dtype=np.int32)
+
+##################### METIS Ensemble Partitioning ######################
+
+def create_metis_executor(worker_num):
+    """Process pool of worker_num METIS workers, or None to run METIS in the calling thread."""
+    if worker_num <= 1:
+        return None
+    # Spawned workers do not inherit locks held by the coordinator's threads
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=worker_num, mp_context=multiprocessing.get_context("spawn"))
+
+class LazyMetisExecutor:
+    """METIS process pool started by the first submit, so runs that never need it spawn no workers.
+
+    Can be shared by threads; shutdown() is a no-op if the pool never started.
+    """
+
+    def __init__(self, worker_num):
+        self.worker_num = worker_num
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        with self._lock:
+            if self._executor is None:
+                self._executor = create_metis_executor(self.worker_num)
+        return self._executor.submit(fn, *args, **kwargs)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+def get_partition_score(graph, node2part, num_partitions, part2pmid=None):
+    """Score of a partition, lower is better: (TDF, E_max, cut link number).
+
+    TDF is only computed with part2pmid, the PM of each part; it is 0 for
+    parts on a single PM.
+    """
+    _, edge_counts = get_vm_loads(graph, node2part, num_partitions)
+    src, dst = graph.edges()
+    cut_link_num = int(np.count_nonzero(node2part[src] != node2part[dst]))
+    tdf = 0 if part2pmid is None else compute_tdf(graph, node2part, dict(enumerate(part2pmid)))
+    return tdf, int(edge_counts.max()), cut_link_num
+
+def get_ensemble_seeds(ensemble_size):
+    """Seeds of an ensemble of ensemble_size METIS runs.
+
+    The first run uses the default METIS options (seed None), so the
+    ensemble is never worse than a single partition_metis() call; the
+    others use seeds 0..ensemble_size - 2.
+    """
+    return [None] + list(range(ensemble_size - 1))
+
+def _partition_metis_in_worker(shared_graph_info, num_partitions, balance, seed):
+    return partition_metis(attach_shared_graph(shared_graph_info), num_partitions, balance=balance, seed=seed)
+
+def partition_metis_ensemble(
+    graph, num_partitions, seeds, balance="nodes", part2pmid=None, executor=None):
+
+    """Partitions the graph with METIS once per seed and keeps the best partition.
+
+    seeds are as given by get_ensemble_seeds(), None standing for the
+    default METIS options. Partitions are compared by
+    get_partition_score(), ties going to the first seed. Seeds run in the
+    process pool executor if given. Returns the part of each node and the
+    seed that reproduces it with partition_metis().
+    """
+    seeds = list(seeds)
+    if num_partitions == 1:
+        return np.zeros(graph.node_num, dtype=np.int32), seeds[0]
+    if executor is None:
+        seed2parts = {seed: partition_metis(graph, num_partitions, balance=balance, seed=seed) for seed in seeds}
+    else:
+        # Workers map the CSR arrays from shared memory instead of unpickling the graph
+        with share_graph(graph) as shared_graph_info:
+            futures = {
+                seed: executor.submit(_partition_metis_in_worker, shared_graph_info, num_partitions, balance, seed)
+                for seed in seeds}
+            seed2parts = {seed: future.result() for seed, future in futures.items()}
+    best_seed = min(seeds, key=lambda seed: get_partition_score(graph, seed2parts[seed], num_partitions, part2pmid))
+    return seed2parts[best_seed], best_seed
+
+######################## Hierarchy Partitioning ########################
+
+# Parts of at most this many nodes are not bisected any further
+HIERARCHY_LEAF_SIZE = 16
+
+def create_bisection_order(graph):
+    """Orders the nodes of the graph by recursive METIS bisection.
+
+    Every part of the bisection tree is a contiguous range of the order,
+    halves in tree order, down to parts of HIERARCHY_LEAF_SIZE nodes (or
+    without links). Each level of the tree costs about one bisection of the
+    whole graph.
+    """
+    ranges = []
+    stack = [(graph, np.arange(graph.node_num, dtype=np.int32))]
+    while stack:
+        part_graph, node_ids = stack.pop()
+        if part_graph.node_num > HIERARCHY_LEAF_SIZE and part_graph.edge_num > 0:
+            _, parts = metis.part_graph(get_metis_graph(part_graph), nparts=2, recursive=True)
+            in_second_half = np.asarray(parts, dtype=bool)
+            if in_second_half.any() and not in_second_half.all():
+                # The first half is pushed last, so it is ordered first
+                for half in (in_second_half, ~in_second_half):
+                    half_ids = np.flatnonzero(half).astype(np.int32)
+                    stack.append((part_graph.subgraph(half_ids), node_ids[half_ids]))
+                continue
+        ranges.append(node_ids)
+    return np.concatenate(ranges)
+
+def get_bisection_order(graph):
+    """Recursive bisection order of the graph, computed once for every num_partitions."""
+    return graph.get_derived("bisection_order", create_bisection_order)
+
+def partition_hierarchy(
+    graph, num_partitions):
+
+    """Partitions the graph into num_partitions ranges of its bisection order, of equal node count.
 
-    return node2serverid
+    Ranges follow the bisection tree, so they are exactly its parts when
+    num_partitions is a power of two (up to the imbalance of each
+    bisection), and unions of neighboring parts otherwise.
+    """
+    node2part = np.empty(graph.node_num, dtype=np.int32)
+    node2part[get_bisection_order(graph)] = \
+        np.arange(graph.node_num, dtype=np.int64) * num_partitions // max(graph.node_num, 1)
+    return node2part
 
 ########################### TBS Partitioning ###########################
 # TBS partitioning need to be downloaded from https://github.com/tbs2022/tbs. Please change this path to the "build" directory compiled out from that project.
@@ -92,14 +244,14 @@ TBS_BIN_DIR = "/home/cnic/open-src/tbs/build"
 TBS_BIN_PATH = os.path.join(TBS_BIN_DIR, "tbs")
 
 
-def run_tbs(full_graph_metis_filepath, pm_num, cpu_capacity):
+def run_tbs(full_graph_metis_filepath, pm_num, cpu_capacity, log_file=None):
     generate_topology_cmd = [
         TBS_BIN_PATH, full_graph_metis_filepath,
         f"--k={pm_num}",
         f"--cpu_capacity={cpu_capacity}",
         "--preconfiguration=esocial"
     ]
-    print(f"Running TBS partitioning with command: {' '.join(generate_topology_cmd)}")
+    print(f"Running TBS partitioning with command: {' '.join(generate_topology_cmd)}", file=log_file)
     original_dir = os.getcwd()
     os.chdir(TBS_BIN_DIR)
     try:
@@ -117,9 +269,9 @@ def run_tbs(full_graph_metis_filepath, pm_num, cpu_capacity):
     # print(f"proc.returncode: {proc.returncode}")
     # if any("Traceback" in line for line in stderr_output):
     if proc.returncode != 0 or any("Traceback" in line for line in stderr_output):
-        print("Error occurred while running TBS partitioning:")
+        print("Error occurred while running TBS partitioning:", file=log_file)
         for line in stderr_output:
-            print(line, end='')
+            print(line, end='', file=log_file)
         return False
     return True
 
@@ -142,8 +294,7 @@ def trial_cpu_capacity_factors():
 
 
 def partition_tbs(
-    nodes, adjacency_list,
-    pm_config_list, input_topo_filepath):
+    graph, pm_config_list, input_topo_filepath, log_file=None):
 
     distinct_pm_ids = set()
     for pm_id, _ in enumerate(pm_config_list):
@@ -155,35 +306,29 @@ def partition_tbs(
     topo_filename_elements = topo_filename.split('.')
     full_graph_metis_filename = '.'.join(topo_filename_elements[:-1]) + ".graph"
     full_graph_metis_filepath = os.path.join(topo_file_dir, full_graph_metis_filename)
-    node_ids, nodeid2name, adj_matrix, edge_num = \
-        convert_adjlist_to_metis_graph(nodes, adjacency_list, full_graph_metis_filepath)
-    node_num = len(node_ids)
+    convert_csr_to_metis_graph(graph, full_graph_metis_filepath)
 
     # Call TBS partitioning program
     pm_num = len(distinct_pm_ids)
-    node_num = len(node_ids)
+    node_num = graph.node_num
     cpu_capacity_factor_to_try = trial_cpu_capacity_factors()
     for cpu_capacity_factor in cpu_capacity_factor_to_try:
-        print(f"Using cpu_capacity_factor {cpu_capacity_factor} for TBS")
+        print(f"Using cpu_capacity_factor {cpu_capacity_factor} for TBS", file=log_file)
         cpu_capacity = int(cpu_capacity_factor * node_num // pm_num)
-        run_success = run_tbs(full_graph_metis_filepath, pm_num, cpu_capacity)
+        run_success = run_tbs(full_graph_metis_filepath, pm_num, cpu_capacity, log_file)
         if run_success:
             break
 
-    # Acquire partition result
+    # Acquire partition result, the i-th line is the PM of node i - 1
     partition_output_filepath = os.path.join(TBS_BIN_DIR, f"tmppartition{pm_num}")
-    nodeid2pmid = {}
+    node2pmid = np.empty(node_num, dtype=np.int32)
     with open(partition_output_filepath, 'r') as f:
         for i, line in enumerate(f):
             node_id = i + 1
             pm_id = int(line.strip())
-            nodeid2pmid[node_id] = pm_id
+            node2pmid[i] = pm_id
             if pm_id not in distinct_pm_ids:
-                print(f"Node {node_id} is assigned to PM {pm_id}, which is not in the server list.")
+                print(f"Node {node_id} is assigned to PM {pm_id}, which is not in the server list.", file=log_file)
                 exit(1)
-    node2pmid = {}
-    for node_id, pm_id in nodeid2pmid.items():
-        node_name = nodeid2name[node_id]
-        node2pmid[node_name] = pm_id
 
     return node2pmid
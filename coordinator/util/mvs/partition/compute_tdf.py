@@ -1,3 +1,5 @@
+import numpy as np
+
 DEFAULT_CROSS_MACHINE_BW = 10000 # Mbps
 
 cross_machine_bw = {
@@ -27,24 +29,29 @@ def get_cross_machine_bw(pm_id_0, pm_id_1):
     cross_machine_bw_key = (pm_id_0, pm_id_1)
     return cross_machine_bw.get(cross_machine_bw_key, DEFAULT_CROSS_MACHINE_BW)
 
-def compute_tdf(nodes, adjacency_list, node2server_id, serverid2pmid):
+def compute_tdf(graph, node2server_id, serverid2pmid):
     # Suppose each virtual link is 100 Mbps, the load on a cross-machine
     # link is the sum of the loads of all virtual links that traverse it.
 
-    # Traverse the adjacency list and compute the load on each cross-machine link
-    cross_machine_load = {}
-    for node in nodes:
-        server_id = node2server_id[node]
-        pm_id = serverid2pmid[server_id]
-        for neighbor in adjacency_list[node]:
-            neighbor_server_id = node2server_id[neighbor]
-            neighbor_pm_id = serverid2pmid[neighbor_server_id]
-            if pm_id < neighbor_pm_id: # Avoid double counting
-                # This is a cross-machine link
-                cross_machine_bw_key = (min(pm_id, neighbor_pm_id), max(pm_id, neighbor_pm_id))
-                if cross_machine_bw_key not in cross_machine_load:
-                    cross_machine_load[cross_machine_bw_key] = 0
-                cross_machine_load[cross_machine_bw_key] += VLINK_BW  # Assuming each link has a load of 10Mbps
+    # Map each node to its PM
+    server_num = max(serverid2pmid) + 1
+    server2pmid = np.zeros(server_num, dtype=np.int64)
+    for server_id, pm_id in serverid2pmid.items():
+        server2pmid[server_id] = pm_id
+    node2pmid = server2pmid[node2server_id]
+
+    # Count virtual links between each pair of PMs
+    src, dst = graph.edges()
+    src_pm_ids, dst_pm_ids = node2pmid[src], node2pmid[dst]
+    cross = src_pm_ids != dst_pm_ids
+    pm_pairs = np.stack([
+        np.minimum(src_pm_ids[cross], dst_pm_ids[cross]),
+        np.maximum(src_pm_ids[cross], dst_pm_ids[cross])], axis=1)
+    pm_pairs, link_nums = np.unique(pm_pairs, axis=0, return_counts=True)
+    cross_machine_load = {
+        (pm_id_0, pm_id_1): link_num * VLINK_BW  # Assuming each link has a load of 10Mbps
+        for (pm_id_0, pm_id_1), link_num in zip(pm_pairs.tolist(), link_nums.tolist())
+    }
 
     # Calculate cross-machine relative load
     cross_machine_relative_load = {}
@@ -81,45 +81,16 @@ def convert_metis_graph_to_topo(input_filepath, output_filepath):
     pass
 
 
-def convert_adjlist_to_metis_graph(nodes, adjacency_list, output_filepath):
-    # Allocate integer node id
-    node_name2id = {}
-    nodeid2name = {}
-    for i, node_name in enumerate(nodes):
-        node_name2id[node_name] = i + 1
-        nodeid2name[i + 1] = node_name
-    node_ids = nodeid2name.keys()
-
-    # Generate a graph with edge weight
+def convert_csr_to_metis_graph(graph, output_filepath):
+    # METIS node IDs are 1-based, every edge has weight 1
     edge_weight = 1
-    edge_num = 0
-    adj_matrix = {}
-    for node_name in nodes:
-        node_id = node_name2id[node_name]
-        for neighbor in adjacency_list[node_name]:
-            neighbor_id = node_name2id[neighbor]
-            if node_id not in adj_matrix:
-                adj_matrix[node_id] = []
-            if neighbor_id not in adj_matrix:
-                adj_matrix[neighbor_id] = []
-            adj_matrix[node_id].append((neighbor_id, edge_weight))
-            adj_matrix[neighbor_id].append((node_id, edge_weight)) # adjacency_list is already bidirectional
-            edge_num += 1
-
-    # Generate a graph with edge weight
-    node_num = len(node_ids)
+    node_names = graph.names().tolist()
     with open(output_filepath, 'w') as f:
-        f.write(f"{node_num} {edge_num} 1\n")
-        for i, node_id in enumerate(sorted(adj_matrix)):
-            assert i == node_id - 1
+        f.write(f"{graph.node_num} {graph.edge_num} 1\n")
+        for node_id in range(graph.node_num):
             # Write a line containing node name
-            node_name = nodeid2name[node_id]
-            f.write(f"% node_name: {node_name}\n")
+            f.write(f"% node_name: {node_names[node_id]}\n")
             # Write a line for neighbors
-            adj_line = ""
-            adj = adj_matrix[node_id]
-            for neighbor, edge_weight in adj:
-                adj_line += f" {neighbor} {edge_weight}"
+            adj_line = "".join(
+                f" {neighbor + 1} {edge_weight}" for neighbor in graph.neighbors(node_id).tolist())
             f.write(f"{adj_line}\n")
-
-    return node_ids, nodeid2name, adj_matrix, edge_num
\ No newline at end of file
@@ -1,56 +1,116 @@
-def read_graph_from_topo_file(input_filepath):
-    """Reads the graph from the old format and returns a node list and adjacency list in the correct format."""
-    nodes = None
-    adjacency_list = None
-    edge_num = 0
-
-    ################# NODE_NAMES to NODES
-    ############ return based on tmp_adjacency_list ? adj_list containing node names
-    ############# modify partition_topo_pm, let it not read input file
-
-    # First scan of file: Get nodes and remove dangling nodes
-    tmp_adjacency_list = {}
+import time
+import concurrent.futures
+import numpy as np
+from .graph import CSRGraph
+
+
+def normalize_topo_edges(src, dst, keep_multi_edges=False):
+    """Removes self-loops and repeated links, keeping first occurrences in order.
+
+    Repeated links are kept with keep_multi_edges. Returns the remaining
+    (src, dst) arrays, and the numbers of removed self-loops and repeated
+    links.
+    """
+    loop_free = src != dst
+    self_loop_num = len(src) - int(loop_free.sum())
+    src, dst = src[loop_free], dst[loop_free]
+    if keep_multi_edges:
+        return src, dst, self_loop_num, 0
+    # Identify each link by its (smaller, larger) endpoint pair
+    node_num = int(max(src.max(initial=-1), dst.max(initial=-1))) + 1
+    link_keys = np.minimum(src, dst).astype(np.int64) * node_num + np.maximum(src, dst)
+    _, first_index = np.unique(link_keys, return_index=True)
+    multi_edge_num = len(src) - len(first_index)
+    if multi_edge_num:
+        first_index.sort()
+        src, dst = src[first_index], dst[first_index]
+    return src, dst, self_loop_num, multi_edge_num
+
+
+def build_graph_from_topo(nodes, edges, keep_multi_edges=False, log_file=None):
+    """Builds a CSRGraph from a node name list and (name, name) links.
+
+    Node names are interned to dense integer IDs in order of first appearance
+    (node list first, then links), and the ID -> name table is kept in the
+    graph. The topology is normalized on the way: self-loops and repeated
+    links are removed, as are dangling nodes (listed but without any link),
+    and the number of each is reported. Topologies made of repeated links
+    by design (e.g. sudoisolated) keep them with keep_multi_edges. The
+    report is printed to log_file (stdout by default).
+    """
+    nodes = np.asarray(nodes)
+    endpoints = np.asarray(edges).reshape(-1)
+    if len(endpoints) == 0:
+        if len(nodes):
+            print(f"Topology normalized: removed {len(nodes)} dangling nodes", file=log_file)
+        return CSRGraph.from_edges([], [], 0, nodes[:0])
+
+    # Intern names with a sort instead of a dict lookup per name
+    all_names = np.concatenate([nodes, endpoints]) if len(nodes) else endpoints
+    unique_names, first_index, inverse = np.unique(
+        all_names, return_index=True, return_inverse=True)
+    appearance_order = np.argsort(first_index, kind='stable')
+    unique_name2id = np.empty(len(unique_names), dtype=np.int32)
+    unique_name2id[appearance_order] = np.arange(len(unique_names), dtype=np.int32)
+    node_names = unique_names[appearance_order]
+    endpoints = unique_name2id[inverse.reshape(-1)[len(nodes):]]
+    src, dst, self_loop_num, multi_edge_num = normalize_topo_edges(
+        endpoints[0::2], endpoints[1::2], keep_multi_edges)
+
+    # Remove dangling nodes
+    linked = np.zeros(len(node_names), dtype=bool)
+    linked[src] = True
+    linked[dst] = True
+    dangling_node_num = len(node_names) - int(linked.sum())
+    if dangling_node_num:
+        new_ids = np.cumsum(linked, dtype=np.int32) - 1
+        src, dst = new_ids[src], new_ids[dst]
+        node_names = node_names[linked]
+
+    if self_loop_num or multi_edge_num or dangling_node_num:
+        print(f"Topology normalized: removed {self_loop_num} self-loops, "
+              f"{multi_edge_num} repeated links and {dangling_node_num} dangling nodes", file=log_file)
+    return CSRGraph.from_edges(src, dst, len(node_names), node_names)
+
+
+def read_graph_from_topo_file(input_filepath, keep_multi_edges=False, log_file=None):
+    """Reads the graph from the old format in a single pass into a CSRGraph.
+
+    keep_multi_edges and log_file are as in build_graph_from_topo().
+    """
     with open(input_filepath, 'r') as f:
         # Parse all nodes first
-        nodes_str = f.readline().strip()
-        nodes = nodes_str.split()
+        nodes = f.readline().split()
+        # Scan links
+        endpoints = f.read().split()
+    return build_graph_from_topo(nodes, endpoints, keep_multi_edges, log_file)
 
-        for node_name in nodes:
-            tmp_adjacency_list[node_name] = []
 
-        # Scan links
-        for line in f:
-            node_name_i, node_name_j = line.strip().split()
-            if node_name_i not in tmp_adjacency_list:
-                tmp_adjacency_list[node_name_i] = []
-            if node_name_j not in tmp_adjacency_list:
-                tmp_adjacency_list[node_name_j] = []
-            tmp_adjacency_list[node_name_i].append(node_name_j)
-            tmp_adjacency_list[node_name_j].append(node_name_i)
-        
-        # Remove dangling nodes
-        for node_name in tmp_adjacency_list:
-            if len(tmp_adjacency_list[node_name]) == 0:
-                nodes.remove(node_name)
-
-    # Second scan of file: Read all links
-    with open(input_filepath, 'r') as f:
-        # Skip the first line
-        nodes_str = f.readline()
+def write_topo_chunks_to_file(filepath, nodes, edge_chunks):
+    """Writes a topology in the old format: a node line, then a line per link.
+
+    Links are taken from an iterable of (k, 2) chunks, so they need not be
+    in memory all at once. Integer chunks are formatted as a whole.
+    """
+    nodes = np.asarray(nodes)
+    with open(filepath, 'w') as f:
+        # Write nodes
+        f.write(' '.join(map(str, nodes.tolist())) + '\n')
+        # Write edges
+        for chunk in edge_chunks:
+            chunk = np.asarray(chunk).reshape(-1, 2)
+            if chunk.dtype.kind not in 'iu':
+                for u, v in chunk.tolist():
+                    f.write(f"{u} {v}\n")
+                continue
+            f.write(("%d %d\n" * len(chunk)) % tuple(chunk.reshape(-1).tolist()))
 
-        # Scan links
-        adjacency_list = {}
-        for line in f:
-            node_name_i, node_name_j = line.strip().split()
-            if node_name_i not in adjacency_list:
-                adjacency_list[node_name_i] = []
-            if node_name_j not in adjacency_list:
-                adjacency_list[node_name_j] = []
-            adjacency_list[node_name_i].append(node_name_j)
-            adjacency_list[node_name_j].append(node_name_i)
-            edge_num += 1
 
-    return nodes, adjacency_list
+def write_topo_to_file(filepath, nodes, edges, chunk_size=1 << 18):
+    """Writes a topology in the old format, formatting chunk_size links at a time."""
+    edges = np.asarray(edges).reshape(-1, 2)
+    write_topo_chunks_to_file(filepath, nodes,
+        (edges[start:start + chunk_size] for start in range(0, len(edges), chunk_size)))
 
 
 def write_subtopo_to_file(filepath, nodes, edges, dangling_edges):
@@ -66,47 +126,148 @@ def write_subtopo_to_file(filepath, nodes, edges, dangling_edges):
             f.write(f"{edge[0]} {edge[1]}\n")
 
 
+def get_subtopo_filepath(input_topo_filepath, i):
+    tmp_filepath_arr = input_topo_filepath.strip().split('.')
+    tmp_filepath_arr = tmp_filepath_arr[0:1] + [f"sub{i}"] + tmp_filepath_arr[1:]
+    return '.'.join(tmp_filepath_arr)
+
+
+# Binary sub-topology format, read by algo.ReadGraphFromFile of the agent:
+# a little-endian header (magic, version, # of nodes, # of internal links,
+# # of dangling links), then int32 node names, int32 (u, v) internal links,
+# and int32 (local, remote, remote server, vxlan ID) dangling links
+SUBTOPO_BINARY_MAGIC = b"SNTB"
+SUBTOPO_BINARY_VERSION = 1
+SUBTOPO_BINARY_HEADER_DTYPE = np.dtype([
+    ("magic", "S4"), ("version", "<u4"),
+    ("node_num", "<u4"), ("internal_edge_num", "<u4"), ("dangling_edge_num", "<u4")])
+SUBTOPO_FORMATS = ("text", "binary")
+
+
+def get_int32_node_names(graph):
+    """Node names as int32, as the agent identifies nodes by 32-bit integers."""
+    node_names = graph.names()
+    try:
+        int_node_names = node_names.astype(np.int64)
+    except ValueError:
+        raise ValueError("Binary sub-topologies need integer node names")
+    if len(int_node_names) and (
+        int_node_names.min() < np.iinfo(np.int32).min or int_node_names.max() > np.iinfo(np.int32).max):
+        raise ValueError("Binary sub-topologies need node names within the int32 range")
+    return int_node_names.astype(np.int32)
+
+
+def write_subtopo_to_binary_file(filepath, nodes, edges, dangling_edges):
+    """Writes the subgraph to the binary format file.
+
+    nodes is an int32 array of names, edges an (E, 2) array of internal link
+    endpoints, dangling_edges a (D, 4) array of (local, remote, remote server, vxlan ID).
+    """
+    header = np.zeros(1, dtype=SUBTOPO_BINARY_HEADER_DTYPE)
+    header[0] = (SUBTOPO_BINARY_MAGIC, SUBTOPO_BINARY_VERSION, len(nodes), len(edges), len(dangling_edges))
+    with open(filepath, 'wb') as f:
+        f.write(header.tobytes())
+        for section in (nodes, edges, dangling_edges):
+            f.write(np.ascontiguousarray(section, dtype='<i4').tobytes())
+
+
+def read_subtopo_header(filepath):
+    """Returns the header of a binary sub-topology, or None for a text one."""
+    with open(filepath, 'rb') as f:
+        header_bytes = f.read(SUBTOPO_BINARY_HEADER_DTYPE.itemsize)
+    if len(header_bytes) < SUBTOPO_BINARY_HEADER_DTYPE.itemsize \
+        or not header_bytes.startswith(SUBTOPO_BINARY_MAGIC):
+        return None
+    header = np.frombuffer(header_bytes, dtype=SUBTOPO_BINARY_HEADER_DTYPE)[0]
+    if header["version"] != SUBTOPO_BINARY_VERSION:
+        raise ValueError(f"Unsupported binary sub-topology version {header['version']} in {filepath}")
+    return header
+
+
+def _group_by_server(serverids, server_num):
+    """Returns the stable order grouping items by server and the group boundaries."""
+    order = np.argsort(serverids, kind='stable')
+    bounds = np.zeros(server_num + 1, dtype=np.int64)
+    np.cumsum(np.bincount(serverids, minlength=server_num), out=bounds[1:])
+    return order, bounds
+
+
+def _write_subtopo_chunks(filepath, nodes, edges, dangling_edges):
+    """Writes the subgraph to the new format file, formatting each section at once.
+
+    nodes is a list of names, edges a flat list of internal link endpoint names,
+    dangling_edges a flat list of (local, remote, remote server, vxlan ID) tuples.
+    """
+    with open(filepath, 'w') as f:
+        f.write(' '.join(map(str, nodes)) + '\n')
+        f.write(("%s %s\n" * (len(edges) // 2)) % tuple(edges))
+        f.write(("%s %s_external_%d_%d\n" * (len(dangling_edges) // 4)) % tuple(dangling_edges))
+
+
 def write_subtopos_to_file(
-    nodes, adjacency_list,
-    node2serverid, server_num, input_topo_filepath):
-    # Collect nodes and edges for each partition
-    subgraphs = {i: {'nodes': [], 'edges': [], 'dangling': []} for i in range(server_num)}
+    graph, node2serverid, server_num, input_topo_filepath,
+    subtopo_format="text", max_workers=None):
+    """Writes the sub-topology of each server to its own file.
 
-    # Group nodes into their respective subgraphs
-    for node, serverid in node2serverid.items():
-        subgraphs[serverid]['nodes'].append(node)
+    Nodes, internal links and dangling links are grouped by server with a
+    stable sort, so each file has the same lines in the same order as a scan
+    over the links of the graph. Files are written concurrently, as text or
+    in the binary format (see SUBTOPO_BINARY_MAGIC).
+    """
+    if subtopo_format not in SUBTOPO_FORMATS:
+        raise ValueError(f"Unknown sub-topology format {subtopo_format}, expected one of {SUBTOPO_FORMATS}")
+    node2serverid = np.asarray(node2serverid)
+    if subtopo_format == "binary":
+        node_names = get_int32_node_names(graph)
+    else:
+        node_names = graph.names()
 
-    # Allocate Vxlan IDs for dangling edges
-    to_alloc_vxlan_id = 4097
-    edge2id = {}
+    # Group nodes into their respective subgraphs
+    node_order, node_bounds = _group_by_server(node2serverid, server_num)
+    grouped_nodes = node_names[node_order]
 
     # Group edges into internal and dangling
-    for u in nodes:
-        for v in adjacency_list[u]:
-            if u >= v:
-                continue
-            u_server_id = node2serverid[u]
-            v_server_id = node2serverid[v]
-            if u_server_id == v_server_id:
-                subgraphs[u_server_id]['edges'].append((u, v))
-            else:
-                # Allocate vxlan ID for the dangling edge
-                cur_vxlan_id = edge2id.get((u, v))
-                if cur_vxlan_id is None:
-                    edge2id[(u, v)] = to_alloc_vxlan_id
-                    cur_vxlan_id = edge2id[(u, v)]
-                    to_alloc_vxlan_id += 1
-                # Add the dangling edge
-                subgraphs[u_server_id]['dangling'].append((u, f"{v}_external_{v_server_id}_{cur_vxlan_id}"))
-                subgraphs[v_server_id]['dangling'].append((v, f"{u}_external_{u_server_id}_{cur_vxlan_id}"))
+    src, dst = graph.edges()
+    src_serverids, dst_serverids = node2serverid[src], node2serverid[dst]
+    internal = src_serverids == dst_serverids
+    internal_order, internal_bounds = _group_by_server(src_serverids[internal], server_num)
+    internal_edges = np.stack(
+        [node_names[src[internal]], node_names[dst[internal]]], axis=1)[internal_order]
+
+    # Allocate Vxlan IDs for dangling edges in order of the links, starting from 4097,
+    # and add each dangling edge to the servers of both of its ends
+    cross_src, cross_dst = src[~internal], dst[~internal]
+    cross_src_serverids, cross_dst_serverids = src_serverids[~internal], dst_serverids[~internal]
+    vxlan_ids = np.arange(4097, 4097 + len(cross_src), dtype=np.int64)
+    dangling_local = np.stack([cross_src, cross_dst], axis=1).reshape(-1)
+    dangling_remote = np.stack([cross_dst, cross_src], axis=1).reshape(-1)
+    dangling_serverids = np.stack([cross_src_serverids, cross_dst_serverids], axis=1).reshape(-1)
+    dangling_remote_serverids = np.stack([cross_dst_serverids, cross_src_serverids], axis=1).reshape(-1)
+    dangling_order, dangling_bounds = _group_by_server(dangling_serverids, server_num)
+    dangling_edges = np.empty(
+        (len(dangling_order), 4), dtype=np.int32 if subtopo_format == "binary" else object)
+    dangling_edges[:, 0] = node_names[dangling_local[dangling_order]]
+    dangling_edges[:, 1] = node_names[dangling_remote[dangling_order]]
+    dangling_edges[:, 2] = dangling_remote_serverids[dangling_order]
+    dangling_edges[:, 3] = np.repeat(vxlan_ids, 2)[dangling_order]
 
     # Write each subgraph to a file in the new format
-    for i in range(server_num):
-        tmp_filepath_arr = input_topo_filepath.strip().split('.')
-        tmp_filepath_arr = tmp_filepath_arr[0:1] + [f"sub{i}"] + tmp_filepath_arr[1:]
-        output_filepath = '.'.join(tmp_filepath_arr)
-        write_subtopo_to_file(output_filepath,
-                               subgraphs[i]['nodes'],
-                               subgraphs[i]['edges'],
-                               subgraphs[i]['dangling'])
-        print(f"Subgraph {i} written to {output_filepath}")
+    def write_subtopo_task(i):
+        start_time = time.time()
+        output_filepath = get_subtopo_filepath(input_topo_filepath, i)
+        nodes = grouped_nodes[node_bounds[i]:node_bounds[i + 1]]
+        edges = internal_edges[internal_bounds[i]:internal_bounds[i + 1]]
+        dangling = dangling_edges[dangling_bounds[i]:dangling_bounds[i + 1]]
+        if subtopo_format == "binary":
+            write_subtopo_to_binary_file(output_filepath, nodes, edges, dangling)
+        else:
+            _write_subtopo_chunks(
+                output_filepath, nodes.tolist(), edges.reshape(-1).tolist(), dangling.reshape(-1).tolist())
+        return output_filepath, time.time() - start_time
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for i, (output_filepath, time_cost) in enumerate(executor.map(write_subtopo_task, range(server_num))):
+            print(f"Subgraph {i} written to {output_filepath} "
+                  f"({internal_bounds[i + 1] - internal_bounds[i]} internal links, "
+                  f"{dangling_bounds[i + 1] - dangling_bounds[i]} dangling links, "
+                  f"{time_cost:.3f}s)")
@@ -0,0 +1,242 @@
+import threading
+from contextlib import contextmanager
+from collections.abc import Mapping
+from multiprocessing import shared_memory
+import numpy as np
+
+
+def _readonly(array, dtype):
+    array = np.ascontiguousarray(array, dtype=dtype)
+    array.flags.writeable = False
+    return array
+
+
+class CSRGraph:
+    """Immutable undirected graph in CSR form.
+
+    xadj/adjncy are int32 arrays with the same meaning as in METIS: the
+    neighbors of node u are adjncy[xadj[u]:xadj[u + 1]], and every link is
+    stored once in each direction. node_names optionally maps node IDs to the
+    names used in topology files (node IDs are used as names if missing).
+    node_ids optionally maps node IDs of a subgraph to node IDs of the graph
+    it was cut from. As the graph never changes, structures derived from it
+    (e.g. its METIS graph) are built once and kept with get_derived().
+    """
+
+    def __init__(self, xadj, adjncy, node_names=None, node_ids=None):
+        self.xadj = _readonly(xadj, np.int32)
+        self.adjncy = _readonly(adjncy, np.int32)
+        self.node_names = None if node_names is None else np.asarray(node_names)
+        self.node_ids = None if node_ids is None else _readonly(node_ids, np.int32)
+        self._derived = {}
+
+    @classmethod
+    def from_edges(cls, src, dst, node_num, node_names=None, node_ids=None):
+        """Builds the graph from link endpoint arrays.
+
+        Neighbors of each node keep the order in which their links are given,
+        so the result is identical to appending links into adjacency lists.
+        """
+        src = np.asarray(src, dtype=np.int32)
+        dst = np.asarray(dst, dtype=np.int32)
+        # Interleave both directions of each link, then stable-sort by source
+        arc_src = np.empty(2 * len(src), dtype=np.int32)
+        arc_dst = np.empty(2 * len(src), dtype=np.int32)
+        arc_src[0::2], arc_src[1::2] = src, dst
+        arc_dst[0::2], arc_dst[1::2] = dst, src
+        order = np.argsort(arc_src, kind='stable')
+        xadj = np.zeros(node_num + 1, dtype=np.int32)
+        np.cumsum(np.bincount(arc_src, minlength=node_num), out=xadj[1:])
+        return cls(xadj, arc_dst[order], node_names, node_ids)
+
+    def get_derived(self, name, build):
+        """Returns build(self), built on the first call with the same name only."""
+        derived = self._derived.get(name)
+        if derived is None:
+            # Concurrent first calls may both build it, the first stored one wins
+            derived = self._derived.setdefault(name, build(self))
+        return derived
+
+    @property
+    def node_num(self):
+        return len(self.xadj) - 1
+
+    @property
+    def edge_num(self):
+        return len(self.adjncy) // 2
+
+    def degrees(self):
+        return np.diff(self.xadj)
+
+    def neighbors(self, u):
+        return self.adjncy[self.xadj[u]:self.xadj[u + 1]]
+
+    def arc_sources(self):
+        """Source node of every entry in adjncy."""
+        return np.repeat(np.arange(self.node_num, dtype=np.int32), self.degrees())
+
+    def name_ranks(self):
+        """Rank of the name of every node among the names sorted as strings."""
+        _, ranks = np.unique(self.names().astype(str), return_inverse=True)
+        return ranks.reshape(-1).astype(np.int32)
+
+    def edges(self):
+        """Returns (src, dst) arrays with each link once, in adjacency order."""
+        src = self.arc_sources()
+        mask = src < self.adjncy
+        return src[mask], self.adjncy[mask]
+
+    def names(self, ids=None):
+        """Returns the names of the given node IDs (all nodes by default)."""
+        if ids is None:
+            ids = np.arange(self.node_num, dtype=np.int32)
+        if self.node_names is None:
+            return np.asarray(ids)
+        return self.node_names[ids]
+
+    def global_ids(self):
+        """Node IDs in the graph this one was cut from."""
+        if self.node_ids is None:
+            return np.arange(self.node_num, dtype=np.int32)
+        return self.node_ids
+
+    def subgraph(self, ids):
+        """Induced subgraph on the given node IDs, keeping their order.
+
+        Only the adjacency of the given nodes is visited, so the cost is
+        proportional to the size of the subgraph (plus a lookup table of
+        node_num entries).
+        """
+        ids = np.asarray(ids, dtype=np.int32)
+        local_ids = np.full(self.node_num, -1, dtype=np.int32)
+        local_ids[ids] = np.arange(len(ids), dtype=np.int32)
+        # Visit links in the order of edges(): by smaller end, then adjacency order
+        sorted_ids = np.sort(ids)
+        degrees = self.degrees()[sorted_ids].astype(np.int64)
+        arc_offsets = np.repeat(self.xadj[sorted_ids].astype(np.int64) - (np.cumsum(degrees) - degrees), degrees)
+        arc_index = np.arange(len(arc_offsets), dtype=np.int64) + arc_offsets
+        src = np.repeat(sorted_ids, degrees)
+        dst = self.adjncy[arc_index]
+        mask = (src < dst) & (local_ids[dst] >= 0)
+        node_names = None if self.node_names is None else self.node_names[ids]
+        return CSRGraph.from_edges(
+            local_ids[src[mask]], local_ids[dst[mask]], len(ids), node_names, self.global_ids()[ids])
+
+
+class GraphShards(Mapping):
+    """Subgraphs of a graph induced by a node -> shard assignment.
+
+    shard_keys lists the shards to expose (possibly empty ones), by default
+    the distinct values of node2shard.
+
+    Only the node IDs of each shard are kept (as slices of one permutation
+    array); a shard's CSRGraph is cut out when first accessed and cached
+    until release() is called, so memory stays close to one copy of the
+    graph plus the shards in use. A shard holding every node is the graph
+    itself.
+    """
+
+    def __init__(self, graph, node2shard, shard_keys=None):
+        self.graph = graph
+        node2shard = np.asarray(node2shard)
+        order = np.argsort(node2shard, kind='stable').astype(np.int32)
+        sorted_shards = node2shard[order]
+        if shard_keys is None:
+            shard_keys = np.unique(sorted_shards).tolist()
+        starts = np.searchsorted(sorted_shards, shard_keys, side='left')
+        ends = np.searchsorted(sorted_shards, shard_keys, side='right')
+        self._shard_node_ids = {
+            key: order[start:end] for key, start, end in zip(shard_keys, starts, ends)}
+        self._shards = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key):
+        with self._lock:
+            shard = self._shards.get(key)
+        if shard is not None:
+            return shard
+        node_ids = self._shard_node_ids[key]
+        if len(node_ids) == self.graph.node_num:
+            shard = self.graph
+        else:
+            shard = self.graph.subgraph(node_ids)
+        with self._lock:
+            return self._shards.setdefault(key, shard)
+
+    def __iter__(self):
+        return iter(self._shard_node_ids)
+
+    def __len__(self):
+        return len(self._shard_node_ids)
+
+    def node_ids(self, key):
+        """Node IDs of a shard in the graph, without cutting it out."""
+        return self._shard_node_ids[key]
+
+    def release(self, key):
+        """Drops the cached subgraph of a shard, it is cut out again on next access."""
+        with self._lock:
+            self._shards.pop(key, None)
+
+
+#####################################
+# Graphs shared with worker processes #
+#####################################
+
+# Graph attached by a worker process, as (shared memory name, shared memory, graph)
+_attached_shared_graph = None
+
+@contextmanager
+def share_graph(graph):
+    """Copies the CSR arrays of the graph to shared memory while open.
+
+    Yields the info attach_shared_graph() needs in a worker process, which
+    maps the arrays instead of unpickling the graph. The ranks of the node
+    names go along, as workers have no names to order nodes by.
+    """
+    name_ranks = graph.get_derived("name_ranks", CSRGraph.name_ranks)
+    shm = shared_memory.SharedMemory(
+        create=True, size=max(graph.xadj.nbytes + graph.adjncy.nbytes + name_ranks.nbytes, 1))
+    try:
+        shared_xadj = np.ndarray(graph.xadj.shape, dtype=graph.xadj.dtype, buffer=shm.buf)
+        shared_adjncy = np.ndarray(
+            graph.adjncy.shape, dtype=graph.adjncy.dtype, buffer=shm.buf, offset=graph.xadj.nbytes)
+        shared_name_ranks = np.ndarray(
+            name_ranks.shape, dtype=np.int32, buffer=shm.buf, offset=graph.xadj.nbytes + graph.adjncy.nbytes)
+        shared_xadj[:] = graph.xadj
+        shared_adjncy[:] = graph.adjncy
+        shared_name_ranks[:] = name_ranks
+        del shared_xadj, shared_adjncy, shared_name_ranks
+        yield (shm.name, len(graph.xadj), len(graph.adjncy))
+    finally:
+        shm.close()
+        shm.unlink()
+
+def attach_shared_graph(shared_graph_info):
+    """Graph shared by share_graph(), attached once per process.
+
+    Only the latest graph stays attached: the mapping of the previous one is
+    closed when another graph arrives, as its sharing has usually ended.
+    """
+    global _attached_shared_graph
+    shm_name, xadj_len, adjncy_len = shared_graph_info
+    if _attached_shared_graph is not None and _attached_shared_graph[0] == shm_name:
+        return _attached_shared_graph[2]
+    if _attached_shared_graph is not None:
+        old_shm = _attached_shared_graph[1]
+        # Drop the graph first, its arrays are views of the mapping
+        _attached_shared_graph = None
+        try:
+            old_shm.close()
+        except BufferError:
+            # Still used somewhere, unmapped once the last view is gone
+            pass
+    shm = shared_memory.SharedMemory(name=shm_name)
+    xadj = np.ndarray((xadj_len,), dtype=np.int32, buffer=shm.buf)
+    adjncy = np.ndarray((adjncy_len,), dtype=np.int32, buffer=shm.buf, offset=xadj.nbytes)
+    name_ranks = np.ndarray(
+        (xadj_len - 1,), dtype=np.int32, buffer=shm.buf, offset=xadj.nbytes + adjncy.nbytes)
+    graph = CSRGraph(xadj, adjncy)
+    graph.get_derived("name_ranks", lambda graph: name_ranks)
+    _attached_shared_graph = (shm_name, shm, graph)
+    return _attached_shared_graph[2]
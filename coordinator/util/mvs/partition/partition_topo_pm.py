@@ -3,13 +3,19 @@ import metis
 import shutil
 import argparse
 import subprocess
+import numpy as np
 from .algorithm import *
+from .graph import GraphShards
 
 def partition_graph_across_pm(
     cross_pm_partition_method,
-    nodes, adjacency_list,
-    pm_config_list, input_topo_filepath):
-    """Partitions the graph across multiple physical machines with TBS according to config."""
+    graph, pm_config_list, input_topo_filepath, ensemble_size=1, log_file=None):
+    """Partitions the graph across multiple physical machines with TBS according to config.
+
+    With METIS and an ensemble_size above 1, the best of the partitions with
+    ensemble_size METIS runs is kept, see partition_metis_ensemble().
+    Progress is printed to log_file (stdout by default).
+    """
 
     # Scan IDs of physical machines
     distinct_pm_ids = set()
@@ -18,56 +24,43 @@ def partition_graph_across_pm(
 
     # If the number of PMs is 1, return the original topology
     if len(distinct_pm_ids) == 1:
-        print("Only one PM is available. No partitioning needed.")
+        print("Only one PM is available. No partitioning needed.", file=log_file)
         pmid = list(distinct_pm_ids)[0]
-        node2pmid = {}
-        for node in nodes:
-            node2pmid[node] = pmid
-        pmid2nodes = {pmid: nodes}
-        pmid2adjacencylist = {pmid: adjacency_list}
-        return node2pmid, pmid2nodes, pmid2adjacencylist
+        node2pmid = np.full(graph.node_num, pmid, dtype=np.int32)
+        return node2pmid, GraphShards(graph, node2pmid)
 
     if cross_pm_partition_method.lower() == "naive":
         node2pmid = partition_naive(
-            nodes, len(pm_config_list))
+            graph, len(pm_config_list))
+    elif cross_pm_partition_method.lower() == "metis" and ensemble_size > 1:
+        executor = create_metis_executor(min(ensemble_size, os.cpu_count()))
+        try:
+            node2pmid, seed = partition_metis_ensemble(
+                graph, len(pm_config_list), get_ensemble_seeds(ensemble_size),
+                part2pmid=list(range(len(pm_config_list))), executor=executor)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        print(f"Cross-PM METIS ensemble kept seed {seed} of {ensemble_size} runs", file=log_file)
     elif cross_pm_partition_method.lower() == "metis":
         node2pmid = partition_metis(
-            nodes, adjacency_list, len(pm_config_list), random=False)
+            graph, len(pm_config_list), random=False)
     elif cross_pm_partition_method.lower() == "tbs":
         node2pmid = partition_tbs(
-            nodes, adjacency_list,
-            pm_config_list, input_topo_filepath)
+            graph, pm_config_list, input_topo_filepath, log_file)
     else:
-        print(f"Cross-PM partitioning method {cross_pm_partition_method} is not identified, exiting...")
+        print(f"Cross-PM partitioning method {cross_pm_partition_method} is not identified, exiting...", file=log_file)
         exit(1)
 
-    # Construct the sub-graph of each PM for partitioning
-    pmid2nodes = {} # Construct node list
-    for pm_id, _ in enumerate(pm_config_list):
-        pmid2nodes[pm_id] = []
-    for node, pm_id in node2pmid.items():
-        pmid2nodes[pm_id].append(node)
-    for pm_id in sorted(pmid2nodes.keys()):
-        print(f"PM {pm_id} has {len(pmid2nodes[pm_id])} nodes.")
-    pmid2adjacencylist = {} # Construct adjacency list
-    pmid2edgenum = {} # Construct adjacency list
-    for pm_id in pmid2nodes.keys():
-        pmid2adjacencylist[pm_id] = {}
-        pmid2edgenum[pm_id] = 0
-        for node in pmid2nodes[pm_id]:
-            pmid2adjacencylist[pm_id][node] = []
-    for node, pm_id in node2pmid.items():
-        # If the node is not dangling, add its neighbors in the same PM into the adjacency list
-        for neighbor in adjacency_list[node]:
-            if node2pmid[neighbor] == pm_id:
-                if neighbor not in pmid2adjacencylist[pm_id]:
-                    pmid2adjacencylist[pm_id][neighbor] = []
-                if node not in pmid2adjacencylist[pm_id]:
-                    pmid2adjacencylist[pm_id][node] = []
-                pmid2adjacencylist[pm_id][node].append(neighbor)
-                pmid2adjacencylist[pm_id][neighbor].append(node)
-                pmid2edgenum[pm_id] += 1
-    for pm_id in sorted(pmid2adjacencylist.keys()):
-        print(f"PM {pm_id} has {pmid2edgenum[pm_id]} edges.")
+    # The sub-graph of each PM is only cut out when it is used
+    pmid2graph = GraphShards(graph, node2pmid, list(range(len(pm_config_list))))
+    pm_node_nums = np.bincount(node2pmid, minlength=len(pm_config_list))
+    src, dst = graph.edges()
+    internal = node2pmid[src] == node2pmid[dst]
+    pm_edge_nums = np.bincount(node2pmid[src[internal]], minlength=len(pm_config_list))
+    for pm_id in sorted(pmid2graph.keys()):
+        print(f"PM {pm_id} has {pm_node_nums[pm_id]} nodes.", file=log_file)
+    for pm_id in sorted(pmid2graph.keys()):
+        print(f"PM {pm_id} has {pm_edge_nums[pm_id]} edges.", file=log_file)
 
-    return node2pmid, pmid2nodes, pmid2adjacencylist
+    return node2pmid, pmid2graph
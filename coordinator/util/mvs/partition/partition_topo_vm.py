@@ -1,55 +1,63 @@
+import os
 import shutil
 import argparse
 import time
+import numpy as np
 from .fmt_util import *
 from .compute_tdf import *
 from .algorithm import *
+from .refine import *
 
 
-def create_metis_adjacency_list(nodes, adjacency_list):
-    """Converts the adjacency list to METIS format where indices must be contiguous."""
-    node_to_index = {node: idx for idx, node in enumerate(nodes)}
-    index_to_node = {idx: node for node, idx in node_to_index.items()}
-    metis_adjacency_list = []
+def partition_graph_across_vm(graph, num_partitions, acc_server_num, random=False, balance="nodes"):
+    """Partitions the graph into num_partitions using METIS, returns the server of each node."""
+    if num_partitions == 1:
+        return np.full(graph.node_num, acc_server_num, dtype=np.int32)
 
-    start_time = time.time()
-    neighbor_count = 0
-    for node in nodes:
-        # Convert the node's neighbors from IDs to indices
-        # neighbors_with_weight = [(node_to_index[neighbor], 1) for neighbor in adjacency_list[node]]  # Add default weight 1
-        # metis_adjacency_list.append(neighbors_with_weight)
-        neighbors = [node_to_index[neighbor] for neighbor in adjacency_list[node]]  # Add default weight 1
-        metis_adjacency_list.append(neighbors)
-        neighbor_count += 1
-        # if neighbor_count % 1000 == 0:
-        #     print(f"Neighbor count: {neighbor_count}")
-    # print("Adjacency list conversion completed. Time-cost: ", time.time() - start_time)
+    node2serverid = partition_metis(
+        graph, num_partitions, random=random, balance=balance)
 
-    return metis_adjacency_list, node_to_index, index_to_node
+    return node2serverid + acc_server_num
 
 
-def partition_graph_across_vm(nodes, adjacency_list, num_partitions, acc_server_num, random=False):
-    """Partitions the graph into num_partitions using METIS and writes each subgraph."""
-    if num_partitions == 1:
-        node2serverid = {}
-        server_id = acc_server_num
-        for node in nodes:
-            node2serverid[node] = server_id
-        return node2serverid
+def refine_partition_across_vm(graph, node2serverid, num_partitions, acc_server_num, pm_config, time_budget, pm_id):
+    """Refines the VM partition of the graph of a PM for its slowest VM, see refine_partition()."""
+    X = pm_config["Parameters"]["X"]
+    Y = pm_config["Parameters"]["Y"]
+    Z = pm_config["Parameters"]["Z"]
 
-    node2serverid = partition_metis(
-        nodes, adjacency_list, num_partitions, random=False)
+    def get_max_loads(node2part):
+        node_counts, edge_counts = get_vm_loads(graph, node2part, num_partitions)
+        setup_times = [get_vm_setup_time(node_count, edge_count, X, Y, Z)
+                       for node_count, edge_count in zip(node_counts.tolist(), edge_counts.tolist())]
+        return int(edge_counts.max()), max(setup_times)
 
-    for node in node2serverid:
-        node2serverid[node] += acc_server_num
-
-    return node2serverid
+    cur_ts = time.time()
+    node2part = node2serverid - acc_server_num
+    refined_node2part, move_num = refine_partition(graph, node2part, num_partitions, X, Y, Z, time_budget)
+    refine_time = time.time() - cur_ts
+    (E_max, setup_time), (refined_E_max, refined_setup_time) = \
+        get_max_loads(node2part), get_max_loads(refined_node2part)
+    print(f"PM #{pm_id} VM refinement: {move_num} moves in {refine_time:.3f}s, "
+          f"E_max {E_max} -> {refined_E_max}, "
+          f"max predicted setup time {setup_time:.3f}s -> {refined_setup_time:.3f}s")
+    return refined_node2part + acc_server_num
 
 
 def partition_topo_across_vms_for_all_pms(
-    nodes, adjacency_list,
-    pmid2nodes, pmid2adjacencylist,
-    vm_config_list, input_topo_filepath):
+    graph, pmid2graph,
+    vm_config_list, input_topo_filepath, subtopo_format="text", balance="nodes",
+    pm_config_list=None, refine_time_budget=0, ensemble_size=1):
+    """Partitions the graph of each PM across its VMs and writes the sub-topologies, returns the TDF.
+
+    With an ensemble_size above 1, the VM partition of each PM is the best
+    of ensemble_size METIS partitions (see get_ensemble_seeds()), run in one
+    process pool shared by all PMs.
+
+    With a positive refine_time_budget, the VM partition of each PM is then
+    refined for its slowest VM for up to that many seconds (PMs are refined
+    concurrently), using the parameters in pm_config_list.
+    """
 
     pm2servernum = {}
     serverid2pmid = {}
@@ -65,35 +73,60 @@ def partition_topo_across_vms_for_all_pms(
 
     # Partition the sub-graph of each PM into VMs
     import concurrent.futures
-    def partition_vm_task(pm_id, pmid2nodes, pmid2adjacencylist, pm_server_num, acc_server_num):
+    def partition_vm_task(pm_id, pmid2graph, pm_server_num, acc_server_num):
         # print(f"Partitioning with PM #{pm_id}...")
-        return partition_graph_across_vm(
-            pmid2nodes[pm_id], pmid2adjacencylist[pm_id], pm_server_num, acc_server_num
-        )
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        futures = []
-        acc_server_num = 0
-        for pm_id, pm_server_num in pm2servernum.items():
-            futures.append(executor.submit(partition_vm_task, pm_id, pmid2nodes, pmid2adjacencylist, pm_server_num, acc_server_num))
-            acc_server_num += pm_server_num
-        node2serverid = {}
-        for future in concurrent.futures.as_completed(futures):
-            node2serverid.update(future.result())
+        pm_graph = pmid2graph[pm_id]
+        if ensemble_size > 1 and pm_server_num > 1:
+            pm_node2part, seed = partition_metis_ensemble(
+                pm_graph, pm_server_num, get_ensemble_seeds(ensemble_size), balance, executor=metis_executor)
+            print(f"PM #{pm_id} METIS ensemble kept seed {seed} of {ensemble_size} runs")
+            pm_node2serverid = pm_node2part + acc_server_num
+        else:
+            pm_node2serverid = partition_graph_across_vm(
+                pm_graph, pm_server_num, acc_server_num, balance=balance
+            )
+        unrefined_pm_node2serverid = pm_node2serverid
+        if refine_time_budget > 0 and pm_server_num > 1:
+            pm_node2serverid = refine_partition_across_vm(
+                pm_graph, pm_node2serverid, pm_server_num, acc_server_num,
+                pm_config_list[pm_id], refine_time_budget, pm_id)
+        pmid2graph.release(pm_id)
+        return pmid2graph.node_ids(pm_id), pm_node2serverid, unrefined_pm_node2serverid
+
+    # PMs share one METIS process pool for their ensembles
+    metis_executor = create_metis_executor(min(ensemble_size, os.cpu_count()))
+    try:
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            futures = []
+            acc_server_num = 0
+            for pm_id, pm_server_num in pm2servernum.items():
+                futures.append(executor.submit(partition_vm_task, pm_id, pmid2graph, pm_server_num, acc_server_num))
+                acc_server_num += pm_server_num
+            node2serverid = np.full(graph.node_num, -1, dtype=np.int32)
+            unrefined_node2serverid = np.full(graph.node_num, -1, dtype=np.int32)
+            for future in concurrent.futures.as_completed(futures):
+                pm_node_ids, pm_node2serverid, unrefined_pm_node2serverid = future.result()
+                node2serverid[pm_node_ids] = pm_node2serverid
+                unrefined_node2serverid[pm_node_ids] = unrefined_pm_node2serverid
+    finally:
+        if metis_executor is not None:
+            metis_executor.shutdown()
 
     # Print # of nodes in each server
-    serverid2nodes = {}
-    for node_name, server_id in node2serverid.items():
-        if serverid2nodes.get(server_id) is None:
-            serverid2nodes[server_id] = []
-        serverid2nodes[server_id].append(node_name)
-    for server_id in sorted(serverid2nodes.keys()):
-        print(f"Server {server_id}: {len(serverid2nodes[server_id])} nodes")
+    server_node_nums = np.bincount(node2serverid, minlength=acc_server_num)
+    for server_id, server_node_num in enumerate(server_node_nums.tolist()):
+        print(f"Server {server_id}: {server_node_num} nodes")
 
-    # Scan the adjacency_list, and allocate VXLAN IDs for cross-pm edges and cross-vm-intra-pm edges
-    write_subtopos_to_file(nodes, adjacency_list, node2serverid, acc_server_num, input_topo_filepath)
+    # Scan the graph, and allocate VXLAN IDs for cross-pm edges and cross-vm-intra-pm edges
+    write_subtopos_to_file(
+        graph, node2serverid, acc_server_num, input_topo_filepath, subtopo_format)
 
     # Calculate and print TDF
-    tdf = compute_tdf(nodes, adjacency_list, node2serverid, serverid2pmid)
+    if refine_time_budget > 0:
+        # Nodes only move between VMs of the same PM
+        unrefined_tdf = compute_tdf(graph, unrefined_node2serverid, serverid2pmid)
+        print(f"TDF before VM refinement: {unrefined_tdf}")
+    tdf = compute_tdf(graph, node2serverid, serverid2pmid)
     print(f"TDF: {tdf}")
 
     return tdf
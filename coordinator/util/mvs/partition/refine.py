@@ -0,0 +1,132 @@
+import math
+import time
+import numpy as np
+
+
+def get_vm_setup_time(node_count, edge_count, X, Y, Z):
+    """Predicted setup time of a VM holding node_count nodes and edge_count links.
+
+    This is the T_sn model of the optimizer, for one VM.
+    """
+    return edge_count * (node_count * X + Z) + edge_count * math.sqrt(2 * edge_count * X * Y)
+
+
+def get_vm_loads(graph, node2part, part_num):
+    """Node and link counts of each part, a cross-part link counting on both sides."""
+    node2part = np.asarray(node2part)
+    src_parts = node2part[graph.arc_sources()]
+    dst_parts = node2part[graph.adjncy]
+    is_cut = src_parts != dst_parts
+    edge_counts = np.bincount(src_parts[~is_cut], minlength=part_num) // 2 + \
+        np.bincount(src_parts[is_cut], minlength=part_num)
+    return np.bincount(node2part, minlength=part_num), edge_counts
+
+
+def refine_partition(graph, node2part, part_num, X, Y, Z, time_budget):
+    """Moves boundary nodes out of the VM with the highest predicted setup time.
+
+    Fiduccia-Mattheyses style local search: boundary nodes of each part sit
+    in gain buckets (links to their best other part minus links kept in
+    their part), updated incrementally as their neighbors move. The part
+    with the highest setup time gives away its highest-gain nodes, each to
+    the neighboring part where the larger of both setup times is lowest,
+    as long as that is below the current maximum. Every node is tried once
+    per pass; passes repeat while they move nodes, until time_budget
+    seconds have passed. Gains carry over from one pass to the next.
+
+    Returns the refined node -> part array and the number of moves.
+    """
+    deadline = time.time() + time_budget
+    xadj, adjncy = graph.xadj.tolist(), graph.adjncy.tolist()
+    part = np.asarray(node2part).tolist()
+    node_counts, edge_counts = (counts.tolist() for counts in get_vm_loads(graph, node2part, part_num))
+    costs = [get_vm_setup_time(node_counts[p], edge_counts[p], X, Y, Z) for p in range(part_num)]
+
+    def count_neighbor_parts(u):
+        part2count = {}
+        for v in adjncy[xadj[u]:xadj[u + 1]]:
+            part2count[part[v]] = part2count.get(part[v], 0) + 1
+        return part2count
+
+    # Gain buckets of each part, as {gain: set of nodes}
+    buckets = [{} for _ in range(part_num)]
+    node2gain = {}
+    locked = set()
+
+    def bucket_node(u):
+        gain = node2gain.pop(u, None)
+        if gain is not None:
+            bucket = buckets[part[u]][gain]
+            bucket.discard(u)
+            if not bucket:
+                del buckets[part[u]][gain]
+        if u in locked:
+            return
+        part2count = count_neighbor_parts(u)
+        kept_num = part2count.pop(part[u], 0)
+        if part2count:
+            gain = max(part2count.values()) - kept_num
+            node2gain[u] = gain
+            buckets[part[u]].setdefault(gain, set()).add(u)
+
+    # Only boundary nodes have a gain, the others are bucketed once a neighbor moves
+    arc_sources = graph.arc_sources()
+    is_cut = np.asarray(node2part)[arc_sources] != np.asarray(node2part)[graph.adjncy]
+    boundary = np.unique(arc_sources[is_cut])
+    for u in boundary.tolist():
+        if time.time() >= deadline:
+            break
+        bucket_node(u)
+
+    move_num = 0
+    while time.time() < deadline:
+        # Gains are kept up to date as nodes move, so a new pass only
+        # buckets again the nodes locked by the previous one
+        pass_move_num = 0
+        tried = list(locked)
+        locked.clear()
+        for u in tried:
+            bucket_node(u)
+
+        while time.time() < deadline:
+            p = max(range(part_num), key=costs.__getitem__)
+            if not buckets[p]:
+                break
+            bucket = buckets[p][max(buckets[p])]
+            u = next(iter(bucket))
+            locked.add(u)
+            bucket_node(u)
+            if node_counts[p] == 1:
+                continue
+
+            # Moving u from p to q takes its links out of p, except the ones
+            # into p, and into q, except the ones already counted there
+            degree = xadj[u + 1] - xadj[u]
+            part2count = count_neighbor_parts(u)
+            kept_num = part2count.pop(p, 0)
+            p_cost = get_vm_setup_time(node_counts[p] - 1, edge_counts[p] - (degree - kept_num), X, Y, Z)
+            best_q, best_cost = None, costs[p]
+            for q, q_link_num in part2count.items():
+                q_cost = get_vm_setup_time(node_counts[q] + 1, edge_counts[q] + (degree - q_link_num), X, Y, Z)
+                if max(p_cost, q_cost) < best_cost:
+                    best_q, best_cost = q, max(p_cost, q_cost)
+            if best_q is None:
+                continue
+
+            q = best_q
+            node_counts[p] -= 1
+            node_counts[q] += 1
+            edge_counts[p] -= degree - kept_num
+            edge_counts[q] += degree - part2count[q]
+            costs[p] = p_cost
+            costs[q] = get_vm_setup_time(node_counts[q], edge_counts[q], X, Y, Z)
+            part[u] = q
+            for v in adjncy[xadj[u]:xadj[u + 1]]:
+                bucket_node(v)
+            pass_move_num += 1
+
+        move_num += pass_move_num
+        if pass_move_num == 0:
+            break
+
+    return np.asarray(part, dtype=np.int32), move_num
@@ -0,0 +1,53 @@
+import io
+import sys
+import time
+import concurrent.futures
+
+
+class Prefetcher:
+    """Runs load(key, log_file) for upcoming keys in a background worker.
+
+    get(key) returns the prefetched result, or loads it in the caller if it
+    was not prefetched. load prints its messages to log_file: stdout when
+    loading in place, and a buffer in the worker, replayed by get(), so the
+    log reads as if the result was loaded in place. Use as a context
+    manager, which waits for the worker on exit.
+    """
+
+    def __init__(self, load, max_workers=1):
+        self.load = load
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self.futures = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        return False
+
+    def _load_with_captured_output(self, key):
+        output = io.StringIO()
+        try:
+            return self.load(key, output), output
+        except BaseException as e:
+            # Raised in get(), once the output up to the error is replayed
+            return e, output
+
+    def prefetch(self, key):
+        """Starts loading key in the background, unless it is already."""
+        if key not in self.futures:
+            print(f"Prefetching {key} in the background...")
+            self.futures[key] = self.executor.submit(self._load_with_captured_output, key)
+
+    def get(self, key):
+        future = self.futures.pop(key, None)
+        if future is None:
+            return self.load(key, None)
+        cur_ts = time.time()
+        result, output = future.result()
+        print(f"Prefetched {key} ready after waiting {time.time() - cur_ts:.3f}s")
+        sys.stdout.write(output.getvalue())
+        if isinstance(result, BaseException):
+            raise result
+        return result
@@ -0,0 +1,101 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+from .mvs.partition.graph import CSRGraph
+from .mvs.partition.fmt_util import read_graph_from_topo_file
+
+COORDINATOR_WORKDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+TOPO_CACHE_DIR = os.path.join(COORDINATOR_WORKDIR, "topo_cache")
+
+# Bump when the loader changes what it produces for the same input
+TOPO_CACHE_FORMAT_VERSION = 2
+TOPO_CACHE_ARRAYS = ("xadj", "adjncy", "node_names")
+
+
+#############################
+# Keys of cached topologies #
+#############################
+
+def get_topo_file_cache_key(topo_filepath, keep_multi_edges=False, chunk_size=1 << 20):
+    """Content hash of a topology file, and of whether its repeated links are kept."""
+    multi_tag = "multi:" if keep_multi_edges else ""
+    hasher = hashlib.sha256(f"v{TOPO_CACHE_FORMAT_VERSION}:file:{multi_tag}".encode())
+    with open(topo_filepath, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            hasher.update(chunk)
+    return f"file-{hasher.hexdigest()[:32]}"
+
+def get_topo_args_cache_key(topo_args):
+    """Hash of the arguments a topology is generated from, e.g. ["grid", "100", "100"]."""
+    key_str = f"v{TOPO_CACHE_FORMAT_VERSION}:args:" + json.dumps([str(arg) for arg in topo_args])
+    return f"args-{hashlib.sha256(key_str.encode()).hexdigest()[:32]}"
+
+
+############################
+# Store and load CSR graph #
+############################
+
+def get_cache_entry_dir(cache_key, cache_dir=TOPO_CACHE_DIR):
+    return os.path.join(cache_dir, cache_key)
+
+def load_graph_from_cache(cache_key, cache_dir=TOPO_CACHE_DIR):
+    """Memory-maps a cached graph, returns None on a cache miss."""
+    entry_dir = get_cache_entry_dir(cache_key, cache_dir)
+    if not os.path.isdir(entry_dir):
+        return None
+    arrays = {}
+    for array_name in TOPO_CACHE_ARRAYS:
+        array_filepath = os.path.join(entry_dir, f"{array_name}.npy")
+        if not os.path.exists(array_filepath):
+            continue
+        arrays[array_name] = np.load(array_filepath, mmap_mode='r')
+    return CSRGraph(arrays["xadj"], arrays["adjncy"], arrays.get("node_names"))
+
+def save_graph_to_cache(cache_key, graph, cache_dir=TOPO_CACHE_DIR):
+    """Stores the graph as .npy files, which are moved in place atomically."""
+    entry_dir = get_cache_entry_dir(cache_key, cache_dir)
+    if os.path.isdir(entry_dir):
+        return entry_dir
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=f".{cache_key}.", dir=cache_dir)
+    try:
+        np.save(os.path.join(tmp_dir, "xadj.npy"), graph.xadj)
+        np.save(os.path.join(tmp_dir, "adjncy.npy"), graph.adjncy)
+        if graph.node_names is not None:
+            node_names = graph.node_names
+            # Numeric names are stored as integers, which is more compact
+            if node_names.dtype.kind == 'U':
+                try:
+                    int_node_names = node_names.astype(np.int64)
+                    if np.array_equal(int_node_names.astype(str), node_names):
+                        node_names = int_node_names
+                except ValueError:
+                    pass
+            np.save(os.path.join(tmp_dir, "node_names.npy"), node_names)
+        os.rename(tmp_dir, entry_dir)
+    except OSError:
+        # Another process has stored the same entry in the meantime
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.isdir(entry_dir):
+            raise
+    return entry_dir
+
+def read_graph_with_cache(topo_filepath, keep_multi_edges=False, cache_dir=TOPO_CACHE_DIR, log_file=None):
+    """Loads the graph of a topology file from the cache, parses the text on a miss.
+
+    Messages are printed to log_file (stdout by default).
+    """
+    cache_key = get_topo_file_cache_key(topo_filepath, keep_multi_edges)
+    graph = load_graph_from_cache(cache_key, cache_dir)
+    if graph is not None:
+        print(f"Topology {topo_filepath} loaded from cache entry {cache_key}", file=log_file)
+        return graph
+    graph = read_graph_from_topo_file(topo_filepath, keep_multi_edges, log_file)
+    save_graph_to_cache(cache_key, graph, cache_dir)
+    return graph
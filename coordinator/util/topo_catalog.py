@@ -0,0 +1,220 @@
+import os
+import re
+import json
+import atexit
+import hashlib
+import threading
+import numpy as np
+from .mvs.partition.fmt_util import \
+    SUBTOPO_BINARY_HEADER_DTYPE, read_subtopo_header
+
+COORDINATOR_WORKDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+TOPO_CATALOG_FILEPATH = os.path.join(COORDINATOR_WORKDIR, "topo_catalog.json")
+TOPO_CATALOG_DIRS = (
+    os.path.join(COORDINATOR_WORKDIR, "topo"),
+    os.path.join(COORDINATOR_WORKDIR, "data"),
+)
+
+# Bump when the statistics of an entry change for the same file
+TOPO_CATALOG_FORMAT_VERSION = 1
+
+# Sub-topologies are rewritten by every test, so their entries only hold
+# counts, which are cheap to rescan
+SUB_TOPO_FILENAME_PATTERN = re.compile(r"\.sub\d+(\.|$)")
+
+_catalog_lock = threading.Lock()
+_catalog = None
+_catalog_dirty = False
+
+
+##################################
+# Statistics of topology files   #
+##################################
+
+def _get_link_stats(node_names, link_endpoints):
+    """Statistics of a graph given as node names and a flat array of link endpoints.
+
+    Self-loops and repeated links are ignored by the degree histogram and
+    simple_link_num, as in dataproc/misc/stat_topo.py.
+    """
+    all_names = np.concatenate([node_names, link_endpoints])
+    _, name_ids = np.unique(all_names, return_inverse=True)
+    name_ids = name_ids.reshape(-1)
+    link_ids = name_ids[len(node_names):].reshape(-1, 2)
+    link_ids = np.sort(link_ids[link_ids[:, 0] != link_ids[:, 1]], axis=1)
+    simple_links = np.unique(link_ids, axis=0) if len(link_ids) else link_ids
+    degrees = np.bincount(simple_links.reshape(-1), minlength=name_ids.max() + 1 if len(name_ids) else 0)
+    return {
+        "simple_link_num": int(len(simple_links)),
+        "degree_hist": np.bincount(degrees).tolist(),
+    }
+
+def scan_topo_file(topo_filepath):
+    """Reads a topology or sub-topology file (text or binary) and returns its statistics."""
+    with open(topo_filepath, 'rb') as f:
+        content = f.read()
+    stats = {
+        "sha256": hashlib.sha256(content).hexdigest(),
+        "size": len(content),
+    }
+
+    header = read_subtopo_header(topo_filepath)
+    if header is not None:
+        offset = SUBTOPO_BINARY_HEADER_DTYPE.itemsize
+        node_num = int(header["node_num"])
+        internal_link_num = int(header["internal_edge_num"])
+        dangling_link_num = int(header["dangling_edge_num"])
+        body = np.frombuffer(
+            content, dtype='<i4', offset=offset,
+            count=node_num + 2 * internal_link_num + 4 * dangling_link_num)
+        node_names = body[:node_num]
+        link_endpoints = body[node_num:node_num + 2 * internal_link_num]
+        dangling_edges = body[node_num + 2 * internal_link_num:].reshape(-1, 4)
+        # A dangling link is identified by its VXLAN ID
+        dangling_endpoints = np.stack([
+            dangling_edges[:, 0].astype(str),
+            np.char.add("vxlan_", dangling_edges[:, 3].astype(str))], axis=1).reshape(-1)
+        stats["format"] = "binary"
+        node_names = node_names.astype(str)
+        link_endpoints = np.concatenate([link_endpoints.astype(str), dangling_endpoints])
+    else:
+        lines = content.decode().split('\n', 1)
+        node_names = np.array(lines[0].split(), dtype=str)
+        tokens = np.array(lines[1].split() if len(lines) > 1 else [], dtype=str)
+        link_endpoints = tokens
+        is_dangling = np.char.find(tokens[1::2], "_external_") >= 0
+        internal_link_num = int(len(is_dangling) - is_dangling.sum())
+        dangling_link_num = int(is_dangling.sum())
+        stats["format"] = "text"
+
+    stats["node_num"] = int(len(node_names))
+    stats["link_num"] = internal_link_num + dangling_link_num
+    stats["internal_link_num"] = internal_link_num
+    stats["dangling_link_num"] = dangling_link_num
+    stats.update(_get_link_stats(node_names, link_endpoints))
+    return stats
+
+
+def scan_sub_topo_file(sub_topo_filepath):
+    """Node and link counts of a sub-topology file (text or binary), without hashing it.
+
+    Binary sub-topologies carry them in their header; a text one is counted
+    a line at a time, dangling links being those to an external node.
+    """
+    stats = {"size": os.path.getsize(sub_topo_filepath)}
+    header = read_subtopo_header(sub_topo_filepath)
+    if header is not None:
+        stats["format"] = "binary"
+        stats["node_num"] = int(header["node_num"])
+        internal_link_num = int(header["internal_edge_num"])
+        dangling_link_num = int(header["dangling_edge_num"])
+    else:
+        stats["format"] = "text"
+        link_num = dangling_link_num = 0
+        with open(sub_topo_filepath, 'rb') as f:
+            stats["node_num"] = len(f.readline().split())
+            for line in f:
+                if line.strip():
+                    link_num += 1
+                    dangling_link_num += b"_external_" in line
+        internal_link_num = link_num - dangling_link_num
+    stats["link_num"] = internal_link_num + dangling_link_num
+    stats["internal_link_num"] = internal_link_num
+    stats["dangling_link_num"] = dangling_link_num
+    return stats
+
+
+#############################
+# Persistent catalog index  #
+#############################
+
+def _get_catalog_key(topo_filepath):
+    topo_filepath = os.path.realpath(topo_filepath)
+    workdir = os.path.realpath(COORDINATOR_WORKDIR)
+    if topo_filepath.startswith(workdir + os.sep):
+        return os.path.relpath(topo_filepath, workdir)
+    return topo_filepath
+
+def _load_catalog():
+    global _catalog
+    if _catalog is None:
+        _catalog = {}
+        if os.path.exists(TOPO_CATALOG_FILEPATH):
+            with open(TOPO_CATALOG_FILEPATH, 'r') as f:
+                catalog = json.load(f)
+            if catalog.get("version") == TOPO_CATALOG_FORMAT_VERSION:
+                _catalog = catalog["entries"]
+    return _catalog
+
+def _is_sub_topo(topo_filepath):
+    return SUB_TOPO_FILENAME_PATTERN.search(os.path.basename(topo_filepath)) is not None
+
+def _save_catalog():
+    global _catalog_dirty
+    if not _catalog_dirty:
+        return
+    tmp_filepath = f"{TOPO_CATALOG_FILEPATH}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_filepath, 'w') as f:
+        json.dump({"version": TOPO_CATALOG_FORMAT_VERSION, "entries": _catalog}, f, indent=1, sort_keys=True)
+    os.replace(tmp_filepath, TOPO_CATALOG_FILEPATH)
+    _catalog_dirty = False
+
+def save_topo_catalog():
+    """Writes the catalog if entries changed since it was last written."""
+    with _catalog_lock:
+        _save_catalog()
+
+# Entries updated by get_topo_stats are written once, when the run ends
+atexit.register(save_topo_catalog)
+
+def _refresh_entry(topo_filepath):
+    """Returns the up-to-date entry of a file, rescanning it if it has changed."""
+    global _catalog_dirty
+    catalog = _load_catalog()
+    key = _get_catalog_key(topo_filepath)
+    file_stat = os.stat(topo_filepath)
+    entry = catalog.get(key)
+    if entry is not None and entry["mtime_ns"] == file_stat.st_mtime_ns and entry["size"] == file_stat.st_size:
+        return entry
+    entry = scan_sub_topo_file(topo_filepath) if _is_sub_topo(topo_filepath) else scan_topo_file(topo_filepath)
+    entry["mtime_ns"] = file_stat.st_mtime_ns
+    catalog[key] = entry
+    _catalog_dirty = True
+    return entry
+
+def get_topo_stats(topo_filepath):
+    """Catalog entry of a topology file, rescanned only if the file has changed.
+
+    Entries of sub-topologies only hold node and link counts.
+    """
+    with _catalog_lock:
+        return dict(_refresh_entry(topo_filepath))
+
+def refresh_topo_catalog(topo_dirs=TOPO_CATALOG_DIRS):
+    """Brings the entries of all topology files under topo_dirs up to date.
+
+    Entries of files which no longer exist are dropped.
+    """
+    global _catalog_dirty
+    with _catalog_lock:
+        catalog = _load_catalog()
+        for topo_dir in topo_dirs:
+            for dirpath, _, filenames in os.walk(topo_dir):
+                for filename in sorted(filenames):
+                    if not filename.endswith(".txt") or filename == "README.txt":
+                        continue
+                    _refresh_entry(os.path.join(dirpath, filename))
+        for key in list(catalog):
+            filepath = key if os.path.isabs(key) else os.path.join(COORDINATOR_WORKDIR, key)
+            if not os.path.exists(filepath):
+                del catalog[key]
+                _catalog_dirty = True
+        _save_catalog()
+        return dict(catalog)
+
+def get_topo_node_num(topo_filepath):
+    return get_topo_stats(topo_filepath)["node_num"]
+
+def get_topo_link_num(topo_filepath):
+    """Number of link lines of a topology, internal plus dangling ones for a sub-topology."""
+    return get_topo_stats(topo_filepath)["link_num"]
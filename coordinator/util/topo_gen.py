@@ -0,0 +1,304 @@
+import os
+import json
+import numpy as np
+
+COORDINATOR_WORKDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+AS_DATA_DIR = os.path.join(COORDINATOR_WORKDIR, "data")
+AS_TOPO_CONFIG_FILEPATH = os.path.join(AS_DATA_DIR, "as_topo_config.json")
+
+WAXMAN_CUTOFF_PROB = 1e-3
+REGULAR_MAX_REPAIR_ROUNDS = 1000
+# Links generated at once by the streaming generators
+EDGE_CHUNK_SIZE = 1 << 18
+
+
+#########################################################
+# In-process topology generators                        #
+# Each returns (nodes, edges): an array of node names   #
+# and an (E, 2) array of links, in the same order as    #
+# the text topology file they describe. Node IDs and    #
+# link endpoints are computed arithmetically with numpy #
+#########################################################
+
+def _node_range(n):
+    return np.arange(1, n + 1, dtype=np.int64)
+
+def generate_isolated_topo(n):
+    n = int(n)
+    return _node_range(n), np.empty((0, 2), dtype=np.int64)
+
+def generate_sudoisolated_topo(l, n):
+    # Two big nodes connected with l links, and n other isolated nodes
+    l, n = int(l), int(n)
+    return _node_range(n + 2), np.tile(np.array([[1, 2]], dtype=np.int64), (l, 1))
+
+def generate_pairs_topo(n):
+    n = int(n)
+    return _node_range(2 * n), _node_range(2 * n).reshape(n, 2)
+
+def generate_chain_topo(n):
+    n = int(n)
+    nodes = _node_range(n)
+    return nodes, np.stack([nodes[:-1], nodes[1:]], axis=1)
+
+def generate_star_topo(n):
+    n = int(n)
+    nodes = _node_range(n)
+    return nodes, np.stack([np.ones(max(n - 1, 0), dtype=np.int64), nodes[1:]], axis=1)
+
+def generate_fullmesh_topo(n):
+    # Links (j, i) for each i, then each j < i
+    n = int(n)
+    i, j = np.tril_indices(n, -1)
+    return _node_range(n), np.stack([j + 1, i + 1], axis=1).astype(np.int64)
+
+def generate_trie_topo(n, k):
+    # Nodes are numbered layer by layer, each layer has k times the nodes of the upper one
+    n, k = int(n), int(k)
+    if k < 2:
+        raise ValueError(f"Trie topology needs k >= 2, got {k}")
+    layer_offsets = [0]
+    while layer_offsets[-1] < n:
+        layer_offsets.append(layer_offsets[-1] + k ** (len(layer_offsets) - 1))
+    layer_offsets = np.array(layer_offsets, dtype=np.int64)
+
+    child = np.arange(1, n, dtype=np.int64) # 0-based index of nodes except the root
+    layer = np.searchsorted(layer_offsets, child, side='right') - 1
+    parent = layer_offsets[layer - 1] + (child - layer_offsets[layer]) // k
+    return _node_range(n), np.stack([child + 1, parent + 1], axis=1)
+
+def generate_grid_topo(x, y):
+    # x * y grid with toroidal (wrap-around) edges, nodes are numbered row by row from 1.
+    # Each node links to its right neighbor (if y > 1), then its bottom neighbor (if x > 1)
+    x, y = int(x), int(y)
+    nodes = _node_range(x * y)
+    node_ids = nodes.reshape(x, y)
+    neighbors = []
+    if y > 1:
+        neighbors.append(np.roll(node_ids, -1, axis=1).reshape(-1))
+    if x > 1:
+        neighbors.append(np.roll(node_ids, -1, axis=0).reshape(-1))
+    if not neighbors:
+        return nodes, np.empty((0, 2), dtype=np.int64)
+    neighbors = np.stack(neighbors, axis=1)
+    sources = np.broadcast_to(nodes.reshape(-1, 1), neighbors.shape)
+    return nodes, np.stack([sources, neighbors], axis=2).reshape(-1, 2)
+
+def generate_clos_topo(k):
+    # Fat tree with k-port switches: per pod k/2 leaves and k/2 spines,
+    # (k/2)^2 superspines, and k/2 clients under each leaf. Nodes are
+    # numbered pod by pod (leaves, then spines), then superspines, then
+    # clients leaf by leaf.
+    k = int(k)
+    h = k // 2
+    pod_num = k
+    superspine_base = pod_num * 2 * h
+    client_base = superspine_base + h * h
+    node_num = client_base + pod_num * h * h
+
+    pod = np.arange(pod_num, dtype=np.int64).reshape(-1, 1, 1)
+    a = np.arange(h, dtype=np.int64).reshape(1, -1, 1)
+    b = np.arange(h, dtype=np.int64).reshape(1, 1, -1)
+    shape = (pod_num, h, h)
+    leaf_a = pod * 2 * h + a + 1
+    leaf_b = np.broadcast_to(leaf_a, shape)
+    spine_a = pod * 2 * h + h + a + 1
+    spine_b = pod * 2 * h + h + b + 1
+
+    # Leaf to spine links for each pod
+    leaf_spine = np.stack(np.broadcast_arrays(leaf_b, spine_b), axis=-1)
+    # Spine to superspine links, the s-th spine of each pod links to superspines s*h .. s*h+h-1
+    spine_superspine = np.stack(np.broadcast_arrays(
+        spine_a, superspine_base + a * h + b + 1), axis=-1)
+    # Client to leaf links
+    client_leaf = np.stack(np.broadcast_arrays(
+        client_base + (pod * h + a) * h + b + 1, leaf_b), axis=-1)
+
+    edges = np.concatenate([
+        leaf_spine.reshape(-1, 2), spine_superspine.reshape(-1, 2), client_leaf.reshape(-1, 2)])
+    return _node_range(node_num), edges
+
+#########################################################
+# Random topologies, reproducible for a given seed.     #
+# Self-loops and repeated links are removed, so the     #
+# link number of BA and Waxman topologies is not exact. #
+# Each generate_*_topo_chunks returns the nodes and an  #
+# iterator of link chunks, drawn from the seeded stream #
+# chunk by chunk, so files are written without holding #
+# all links; generate_*_topo concatenates them          #
+#########################################################
+
+def _concat_edge_chunks(nodes, edge_chunks):
+    edges = list(edge_chunks)
+    return nodes, np.concatenate(edges) if edges else np.empty((0, 2), dtype=np.int64)
+
+def _get_pair_keys(pairs):
+    """One integer per (u, v) pair with u <= v, for uniqueness checks."""
+    return pairs[:, 0] * (int(pairs.max(initial=0)) + 1) + pairs[:, 1]
+
+def _remove_loops_and_multi_edges(src, dst):
+    """Drops self-loops and repeated links, keeping first occurrences in order."""
+    loop_free = src != dst
+    src, dst = src[loop_free], dst[loop_free]
+    pairs = np.stack([np.minimum(src, dst), np.maximum(src, dst)], axis=1)
+    _, first_index = np.unique(_get_pair_keys(pairs), return_index=True)
+    first_index.sort()
+    return pairs[first_index]
+
+def generate_ba_topo_chunks(n, m, seed, chunk_size=EDGE_CHUNK_SIZE):
+    # Barabasi-Albert preferential attachment with the Batagelj-Brandes method:
+    # each new node adds m links, and the other end of a link is a uniformly
+    # chosen endpoint of earlier links. An endpoint that is itself the far end
+    # of an earlier link is resolved by pointer jumping instead of a loop.
+    # Only the far end of every link slot is kept across chunks, as int32.
+    n, m, seed = int(n), int(m), int(seed)
+    if n < 2 or m < 1:
+        raise ValueError(f"BA topology needs n >= 2 and m >= 1, got n={n}, m={m}")
+
+    def iter_edges():
+        rng = np.random.default_rng(seed)
+        slot_num = (n - 1) * m
+        far_ends = np.empty(slot_num, dtype=np.int32)
+        # Chunks hold whole nodes, as repeated links are only among those of a node
+        chunk_slot_num = max(1, chunk_size // m) * m
+        for start in range(0, slot_num, chunk_slot_num):
+            slot = np.arange(start, min(start + chunk_slot_num, slot_num), dtype=np.int64)
+            src = slot // m + 1 # Link slot k is added by node k // m + 1
+
+            # Endpoint r of the first 2k endpoints: even r is the new node of slot r // 2,
+            # odd r is the far end of slot r // 2
+            r = (rng.random(len(slot)) * (2 * slot)).astype(np.int64)
+            dst = np.where(r % 2 == 0, r // 2 // m + 1, -1)
+            if start == 0:
+                dst[:m] = 0 # The first node links to the initial one
+            far_ends[slot] = dst
+            # Far ends in earlier chunks are resolved, so pointers only jump within this one
+            ptr = r // 2
+            unresolved = np.flatnonzero(dst < 0)
+            while len(unresolved):
+                target = ptr[unresolved]
+                resolved = far_ends[target] >= 0
+                far_ends[start + unresolved[resolved]] = far_ends[target[resolved]]
+                unresolved = unresolved[~resolved]
+                ptr[unresolved] = ptr[ptr[unresolved] - start]
+            yield _remove_loops_and_multi_edges(src, far_ends[slot].astype(np.int64)) + 1
+
+    return _node_range(n), iter_edges()
+
+def generate_ba_topo(n, m, seed):
+    return _concat_edge_chunks(*generate_ba_topo_chunks(n, m, seed))
+
+def _iter_cell_pairs(cell_start, cell_num, grid_size, reach, chunk_cells=1 << 12):
+    """Yields (i, j) point index arrays of all pairs in cells at most reach cells apart.
+
+    Points are sorted by cell; cell_start[c]:cell_start[c + 1] are the points
+    of cell c = y * grid_size + x. Each unordered pair is yielded once.
+    """
+    offsets = [(dx, dy) for dy in range(reach + 1) for dx in range(-reach, reach + 1) if dy > 0 or dx >= 0]
+    for dx, dy in offsets:
+        for chunk_start in range(0, cell_num, chunk_cells):
+            cells = np.arange(chunk_start, min(chunk_start + chunk_cells, cell_num), dtype=np.int64)
+            x, y = cells % grid_size + dx, cells // grid_size + dy
+            valid = (x >= 0) & (x < grid_size) & (y < grid_size)
+            cells, other_cells = cells[valid], (y * grid_size + x)[valid]
+            counts = cell_start[cells + 1] - cell_start[cells]
+            other_counts = cell_start[other_cells + 1] - cell_start[other_cells]
+            pair_nums = counts * other_counts
+            if pair_nums.sum() == 0:
+                continue
+            # Pair t of a cell pair with a * b pairs is (t // b, t % b)
+            pair_cell = np.repeat(np.arange(len(cells)), pair_nums)
+            t = np.arange(pair_nums.sum()) - np.repeat(np.cumsum(pair_nums) - pair_nums, pair_nums)
+            i = cell_start[cells][pair_cell] + t // other_counts[pair_cell]
+            j = cell_start[other_cells][pair_cell] + t % other_counts[pair_cell]
+            if dx == 0 and dy == 0:
+                i, j = i[i < j], j[i < j]
+            yield i, j
+
+def generate_waxman_topo_chunks(n, degree, seed):
+    # Waxman graph on the unit square: nodes u, v are linked with probability
+    # exp(-d(u, v) / s), where s is chosen for the given mean degree. Pairs are
+    # only drawn within a cutoff distance, beyond which the probability is below
+    # WAXMAN_CUTOFF_PROB, and are found with a grid of half-cutoff-sized cells.
+    # Each chunk holds the links of a group of cells, as (smaller, larger) node pairs.
+    n, degree, seed = int(n), float(degree), int(seed)
+    if n < 2 or degree <= 0:
+        raise ValueError(f"Waxman topology needs n >= 2 and degree > 0, got n={n}, degree={degree}")
+
+    def iter_edges():
+        rng = np.random.default_rng(seed)
+        # Mean degree ~ n * integral of exp(-d / s) over the plane = n * 2 * pi * s^2
+        s = np.sqrt(degree / (2 * np.pi * n))
+        cutoff = -s * np.log(WAXMAN_CUTOFF_PROB)
+        grid_size = max(1, int(2 / cutoff))
+
+        points = rng.random((n, 2))
+        cells = np.minimum((points * grid_size).astype(np.int64), grid_size - 1)
+        cell_ids = cells[:, 1] * grid_size + cells[:, 0]
+        order = np.argsort(cell_ids, kind='stable')
+        xs, ys = points[order, 0], points[order, 1]
+        del points, cells
+        cell_start = np.zeros(grid_size * grid_size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cell_ids, minlength=grid_size * grid_size), out=cell_start[1:])
+        del cell_ids
+
+        for i, j in _iter_cell_pairs(cell_start, grid_size * grid_size, grid_size, 2):
+            d2 = (xs[i] - xs[j]) ** 2 + (ys[i] - ys[j]) ** 2
+            close = d2 < cutoff * cutoff
+            i, j = i[close], j[close]
+            linked = rng.random(len(i)) < np.exp(-np.sqrt(d2[close]) / s)
+            # Number nodes by position in the original draw
+            edges = np.sort(np.stack([order[i[linked]], order[j[linked]]], axis=1), axis=1)
+            if len(edges):
+                yield edges + 1
+
+    return _node_range(n), iter_edges()
+
+def generate_waxman_topo(n, degree, seed):
+    return _concat_edge_chunks(*generate_waxman_topo_chunks(n, degree, seed))
+
+def generate_regular_topo_chunks(n, d, seed, chunk_size=EDGE_CHUNK_SIZE):
+    # The repairs of the configuration model need every pair, so the n * d
+    # endpoint stubs are held at once, and only handed out in chunks
+    nodes, pairs = generate_regular_topo(n, d, seed)
+    return nodes, (pairs[start:start + chunk_size] for start in range(0, len(pairs), chunk_size))
+
+def generate_regular_topo(n, d, seed):
+    # Random d-regular graph with the configuration model: endpoint stubs are
+    # shuffled and paired, and pairs forming self-loops or repeated links are
+    # re-paired together with as many random valid pairs until none is left.
+    n, d, seed = int(n), int(d), int(seed)
+    if n * d % 2 != 0 or d >= n or d < 0:
+        raise ValueError(f"Random regular topology needs n * d even and d < n, got n={n}, d={d}")
+    rng = np.random.default_rng(seed)
+    pairs = rng.permutation(np.repeat(np.arange(n, dtype=np.int64), d)).reshape(-1, 2)
+    for _ in range(REGULAR_MAX_REPAIR_ROUNDS):
+        sorted_pairs = np.sort(pairs, axis=1)
+        bad = sorted_pairs[:, 0] == sorted_pairs[:, 1]
+        _, first_index = np.unique(_get_pair_keys(sorted_pairs), return_index=True)
+        repeated = np.ones(len(pairs), dtype=bool)
+        repeated[first_index] = False
+        bad |= repeated
+        if not bad.any():
+            return _node_range(n), pairs + 1
+        good_ids = np.flatnonzero(~bad)
+        repair_ids = np.concatenate([
+            np.flatnonzero(bad),
+            rng.choice(good_ids, size=min(len(good_ids), int(bad.sum())), replace=False)])
+        pairs[repair_ids] = rng.permutation(pairs[repair_ids].reshape(-1)).reshape(-1, 2)
+    raise ValueError(f"Failed to generate a random {d}-regular topology with {n} nodes, try another seed")
+
+def get_as_topo_data_filepath(size):
+    with open(AS_TOPO_CONFIG_FILEPATH, 'r') as f:
+        as_topo_config = json.load(f)
+    try:
+        return os.path.join(AS_DATA_DIR, as_topo_config[size])
+    except KeyError:
+        raise ValueError(f"Invalid size of AS topology: {size}, expected one of {list(as_topo_config)}")
+
+def generate_as_topo(size):
+    # BGP AS topologies are extracted from CAIDA data in advance
+    with open(get_as_topo_data_filepath(size), 'r') as f:
+        nodes = np.array(f.readline().split())
+        edges = np.array(f.read().split()).reshape(-1, 2)
+    return nodes, edges
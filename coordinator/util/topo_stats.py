@@ -0,0 +1,119 @@
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse import csgraph
+
+# Default numbers of sampled nodes for the diameter and clustering estimates
+DIAMETER_SAMPLE_NUM = 4
+CLUSTERING_SAMPLE_NUM = 2000
+# Sampled nodes whose 2-hop rows are multiplied at once
+CLUSTERING_BATCH_SIZE = 256
+
+
+def get_adjacency_matrix(graph):
+    """Symmetric 0/1 adjacency matrix of a CSRGraph, sharing its index arrays."""
+    data = np.ones(len(graph.adjncy), dtype=np.int32)
+    return sp.csr_matrix((data, graph.adjncy, graph.xadj), shape=(graph.node_num, graph.node_num))
+
+
+##################################
+# Statistics of a CSR graph      #
+##################################
+
+def get_degree_stats(graph):
+    degrees = graph.degrees()
+    n = graph.node_num
+    m = graph.edge_num
+    return {
+        "node_num": int(n),
+        "link_num": int(m),
+        "min_degree": int(degrees.min()) if n else 0,
+        "avg_degree": float(2 * m / n) if n else 0.0,
+        "max_degree": int(degrees.max()) if n else 0,
+        "density": float(2 * m / (n * (n - 1))) if n > 1 else 0.0,
+        "degree_hist": np.bincount(degrees).tolist(),
+    }
+
+def get_component_stats(graph, adj=None):
+    """Number of connected components and their sizes, largest first."""
+    adj = get_adjacency_matrix(graph) if adj is None else adj
+    component_num, node2component = csgraph.connected_components(adj, directed=False)
+    component_sizes = np.sort(np.bincount(node2component, minlength=component_num))[::-1]
+    return {
+        "component_num": int(component_num),
+        "largest_component_size": int(component_sizes[0]) if component_num else 0,
+        "component_size_hist": {
+            str(size): int(count) for size, count in zip(*np.unique(component_sizes, return_counts=True))},
+    }, node2component
+
+def _bfs_farthest(adj, source):
+    """Farthest node from source and its distance, by one BFS."""
+    # The adjacency matrix is symmetric, so it needs no symmetrization
+    order, predecessors = csgraph.breadth_first_order(
+        adj, source, directed=True, return_predecessors=True)
+    farthest = node = int(order[-1])
+    distance = 0
+    while node != source:
+        node = int(predecessors[node])
+        distance += 1
+    return farthest, distance
+
+def estimate_diameter(graph, sample_num=DIAMETER_SAMPLE_NUM, seed=0, adj=None, node2component=None):
+    """Lower bound of the diameter by double sweeps from sampled nodes.
+
+    Each sweep runs a BFS from a random node of the largest component, then
+    another one from the farthest node found; the largest eccentricity seen
+    is returned. This is exact on trees and usually tight on sparse graphs.
+    """
+    if graph.node_num == 0:
+        return 0
+    adj = get_adjacency_matrix(graph) if adj is None else adj
+    if node2component is None:
+        _, node2component = csgraph.connected_components(adj, directed=False)
+    candidates = np.flatnonzero(node2component == np.bincount(node2component).argmax())
+    rng = np.random.default_rng(seed)
+    sources = rng.choice(candidates, size=min(sample_num, len(candidates)), replace=False)
+    diameter = 0
+    for source in sources.tolist():
+        farthest, distance = _bfs_farthest(adj, source)
+        diameter = max(diameter, distance, _bfs_farthest(adj, farthest)[1])
+    return diameter
+
+def estimate_clustering(graph, sample_num=CLUSTERING_SAMPLE_NUM, seed=0, adj=None):
+    """Average local clustering coefficient over sampled nodes.
+
+    Nodes with fewer than two neighbors count as 0, as in networkx. All
+    nodes are used if the graph has at most sample_num nodes.
+    """
+    if graph.node_num == 0:
+        return 0.0
+    adj = get_adjacency_matrix(graph) if adj is None else adj
+    if graph.node_num <= sample_num:
+        samples = np.arange(graph.node_num)
+    else:
+        samples = np.random.default_rng(seed).choice(graph.node_num, size=sample_num, replace=False)
+    degrees = graph.degrees()[samples].astype(np.float64)
+    triangles = np.empty(len(samples), dtype=np.float64)
+    for start in range(0, len(samples), CLUSTERING_BATCH_SIZE):
+        rows = adj[samples[start:start + CLUSTERING_BATCH_SIZE]]
+        # Links among the neighbors of each sampled node, each counted twice
+        triangles[start:start + len(rows.indptr) - 1] = \
+            np.asarray((rows @ adj).multiply(rows).sum(axis=1)).reshape(-1) / 2
+    pairs = degrees * (degrees - 1) / 2
+    local_clustering = np.divide(triangles, pairs, out=np.zeros_like(triangles), where=pairs > 0)
+    return float(local_clustering.mean())
+
+def get_graph_stats(graph, diameter_sample_num=DIAMETER_SAMPLE_NUM,
+                    clustering_sample_num=CLUSTERING_SAMPLE_NUM, seed=0):
+    """Degree distribution, density, components, sampled diameter and clustering of a CSRGraph."""
+    adj = get_adjacency_matrix(graph)
+    stats = get_degree_stats(graph)
+    component_stats, node2component = get_component_stats(graph, adj)
+    stats.update(component_stats)
+    stats["sampled_diameter"] = estimate_diameter(
+        graph, diameter_sample_num, seed, adj, node2component)
+    stats["sampled_avg_clustering"] = estimate_clustering(
+        graph, clustering_sample_num, seed, adj)
+    stats["diameter_sample_num"] = diameter_sample_num
+    stats["clustering_sample_num"] = min(clustering_sample_num, graph.node_num)
+    stats["seed"] = seed
+    return stats
@@ -1,6 +1,10 @@
 import os
 import json
-import subprocess
+import inspect
+from .topo_gen import *
+from .topo_cache import *
+from .topo_catalog import get_topo_node_num, get_topo_link_num
+from .mvs.partition.fmt_util import build_graph_from_topo, write_topo_to_file, write_topo_chunks_to_file
 
 COORDINATOR_WORKDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
 AS_DATA_DIR = os.path.join(COORDINATOR_WORKDIR, "data")
@@ -15,6 +19,9 @@ LOCAL_TOPO_DIR = os.path.join(COORDINATOR_WORKDIR, "topo")
 def get_full_topo_filename(topo_args):
     return f"{'_'.join(topo_args)}.txt"
 
+def get_full_topo_filepath(topo_args, output_dir):
+    return os.path.join(output_dir, get_full_topo_filename(topo_args))
+
 def get_sub_topo_filename(topo_args, i):
     full_topo_filename = get_full_topo_filename(topo_args)
     splited_topo_filename = full_topo_filename.split('.')
@@ -25,20 +32,84 @@ def get_sub_topo_filename(topo_args, i):
     sub_topo_filename = '.'.join(splited_sub_topo_filename)
     return sub_topo_filename
 
-def generate_topo(topo, output_dir):
-    topo_type = topo[0]
-    full_topo_filename = get_full_topo_filename(topo)
-    full_topo_filepath = os.path.join(output_dir, full_topo_filename)
-    generate_topo_type_script_path = os.path.join(COORDINATOR_WORKDIR, "scripts", "topo", f"generate_{topo_type}_topo.py")
+def run_topo_generator(topo, chunked=False):
+    """Runs the in-process generator of a topology, returns (nodes, edges).
+
+    If chunked, edges is an iterable of link chunks instead of an array,
+    drawn lazily by the topology types that have a chunked generator.
+    """
+    topo_type, topo_params = topo[0], topo[1:]
+    try:
+        generate = topo_funcs[topo_type]["generate"]
+        if chunked:
+            generate = topo_funcs[topo_type].get("generate_chunks", generate)
+    except KeyError:
+        raise ValueError(f"Unknown topology type: {topo_type}, expected one of {list(topo_funcs)}")
     try:
-        generate_topology_cmd = \
-            ["python3", generate_topo_type_script_path] + topo[1:] + [full_topo_filepath]
-    except IndexError:
-        generate_topology_cmd = \
-            ["python3", generate_topo_type_script_path, full_topo_filepath]
-    result = subprocess.run(generate_topology_cmd, capture_output=True, text=True)
+        inspect.signature(generate).bind(*topo_params)
+    except TypeError:
+        expected_params = list(inspect.signature(generate).parameters)
+        raise ValueError(f"Invalid arguments of {topo_type} topology: {topo_params}, expected {expected_params}")
+    nodes, edges = generate(*topo_params)
+    if chunked and generate is topo_funcs[topo_type]["generate"]:
+        edges = [edges]
+    return nodes, edges
+
+def count_generated_links(topo):
+    """Link number of a topology, counted over its link chunks without keeping them."""
+    _, edge_chunks = run_topo_generator(topo, chunked=True)
+    return int(sum(len(chunk) for chunk in edge_chunks))
+
+def generate_topo(topo, output_dir):
+    """Writes the topology file, unless it already exists. Returns its path."""
+    full_topo_filepath = get_full_topo_filepath(topo, output_dir)
+    if not os.path.exists(full_topo_filepath):
+        write_topo_chunks_to_file(full_topo_filepath, *run_topo_generator(topo, chunked=True))
     return full_topo_filepath
 
+def get_topo_type_of_file(topo_filepath):
+    """Topology type of a file named by get_full_topo_filename(), None if unknown."""
+    topo_type = os.path.basename(topo_filepath).split('_')[0]
+    return topo_type if topo_type in topo_funcs else None
+
+def read_topo_file_graph(topo_filepath):
+    """Returns the CSRGraph of a topology file, normalized as its topology type is when generated."""
+    topo_type = get_topo_type_of_file(topo_filepath)
+    keep_multi_edges = topo_type is not None and topo_funcs[topo_type].get("keep_multi_edges", False)
+    return read_graph_with_cache(topo_filepath, keep_multi_edges)
+
+def generate_topo_graph(topo, output_dir=None, log_file=None):
+    """Returns the CSRGraph of a topology, generated in-process on a cache miss.
+
+    Topologies backed by a data file are cached by the content of that file,
+    others by their arguments. The text topology file is written into
+    output_dir only if asked for and not there yet. Messages are printed to
+    log_file (stdout by default).
+    """
+    get_source_filepath = topo_funcs.get(topo[0], {}).get("get_source_filepath")
+    if get_source_filepath is not None:
+        graph = read_graph_with_cache(get_source_filepath(*topo[1:]), log_file=log_file)
+        if output_dir is not None:
+            generate_topo(topo, output_dir)
+        return graph
+
+    cache_key = get_topo_args_cache_key(topo)
+    graph = load_graph_from_cache(cache_key)
+    if graph is not None and output_dir is not None:
+        generate_topo(topo, output_dir)
+    if graph is not None:
+        return graph
+
+    nodes, edges = run_topo_generator(topo)
+    keep_multi_edges = topo_funcs[topo[0]].get("keep_multi_edges", False)
+    graph = build_graph_from_topo(nodes, edges, keep_multi_edges, log_file)
+    save_graph_to_cache(cache_key, graph)
+    if output_dir is not None:
+        full_topo_filepath = get_full_topo_filepath(topo, output_dir)
+        if not os.path.exists(full_topo_filepath):
+            write_topo_to_file(full_topo_filepath, nodes, edges)
+    return graph
+
 
 ###################################################################
 # Functions to get node and link numbers for different topologies #
@@ -122,73 +193,107 @@ def get_clos_link_num(k):
     link_num = ((superspine_num + spine_num + leaf_num) * k + client_num) / 2
     return int(link_num)
 
+def get_ba_node_num(n, m, seed):
+    n = int(n)
+    return int(n)
+
+def get_ba_link_num(n, m, seed):
+    # Repeated links are dropped, so the link number is not known in closed form
+    return count_generated_links(["ba", n, m, seed])
+
+def get_waxman_node_num(n, degree, seed):
+    n = int(n)
+    return int(n)
+
+def get_waxman_link_num(n, degree, seed):
+    return count_generated_links(["waxman", n, degree, seed])
+
+def get_regular_node_num(n, d, seed):
+    n = int(n)
+    return int(n)
+
+def get_regular_link_num(n, d, seed):
+    n, d = int(n), int(d)
+    return int(n * d // 2)
+
 def get_as_node_num(size):
-    with open(AS_TOPO_CONFIG_FILEPATH, 'r') as f:
-        as_topo_config = json.load(f)
-    try:
-        src_filepath = os.path.join(AS_DATA_DIR, as_topo_config[size])
-    except KeyError:
-        print(f"Invalid size: {size}")
-        exit(1)
-    with open(src_filepath, 'r') as f:
-        first_line = f.readline().strip()
-        node_num = len(first_line.split())
-    return node_num
+    return get_topo_node_num(get_as_topo_data_filepath(size))
 
 def get_as_link_num(size):
-    with open(AS_TOPO_CONFIG_FILEPATH, 'r') as f:
-        as_topo_config = json.load(f)
-    try:
-        src_filepath = os.path.join(AS_DATA_DIR, as_topo_config[size])
-    except KeyError:
-        print(f"Invalid size: {size}")
-        exit(1)
-    with open(src_filepath, 'r') as f:
-        line_num = 0
-        for line in f:
-            line_num += 1
-    link_num = line_num - 1
-    return link_num
+    return get_topo_link_num(get_as_topo_data_filepath(size))
 
 topo_funcs = {
     "isolated": {
         "get_node_num": get_isolated_node_num,
         "get_link_num": get_isolated_link_num,
+        "generate": generate_isolated_topo,
     },
     "sudoisolated": {
         "get_node_num": get_sudoisolated_node_num,
         "get_link_num": get_sudoisolated_link_num,
+        "generate": generate_sudoisolated_topo,
+        # Its l links all join the same two nodes
+        "keep_multi_edges": True,
     },
     "pairs": {
         "get_node_num": get_pairs_node_num,
         "get_link_num": get_pairs_link_num,
+        "generate": generate_pairs_topo,
     },
     "chain": {
         "get_node_num": get_chain_node_num,
         "get_link_num": get_chain_link_num,
+        "generate": generate_chain_topo,
     },
     "star": {
         "get_node_num": get_star_node_num,
         "get_link_num": get_star_link_num,
+        "generate": generate_star_topo,
     },
     "fullmesh": {
         "get_node_num": get_fullmesh_node_num,
         "get_link_num": get_fullmesh_link_num,
+        "generate": generate_fullmesh_topo,
     },
     "trie": {
         "get_node_num": get_trie_node_num,
         "get_link_num": get_trie_link_num,
+        "generate": generate_trie_topo,
     },
     "grid": {
         "get_node_num": get_grid_node_num,
         "get_link_num": get_grid_link_num,
+        "generate": generate_grid_topo,
+        # A side of 2 wraps around onto the same links, counted in get_grid_link_num
+        "keep_multi_edges": True,
     },
     "clos": {
         "get_node_num": get_clos_node_num,
         "get_link_num": get_clos_link_num,
+        "generate": generate_clos_topo,
+    },
+    "ba": {
+        "get_node_num": get_ba_node_num,
+        "get_link_num": get_ba_link_num,
+        "generate": generate_ba_topo,
+        "generate_chunks": generate_ba_topo_chunks,
+    },
+    "waxman": {
+        "get_node_num": get_waxman_node_num,
+        "get_link_num": get_waxman_link_num,
+        "generate": generate_waxman_topo,
+        "generate_chunks": generate_waxman_topo_chunks,
+    },
+    "regular": {
+        "get_node_num": get_regular_node_num,
+        "get_link_num": get_regular_link_num,
+        "generate": generate_regular_topo,
+        "generate_chunks": generate_regular_topo_chunks,
     },
     "as": {
         "get_node_num": get_as_node_num,
         "get_link_num": get_as_link_num,
+        "generate": generate_as_topo,
+        "get_source_filepath": get_as_topo_data_filepath,
     },
 }
@@ -0,0 +1,78 @@
+import os
+import sys
+import csv
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "coordinator"))
+from util.topo_util import read_topo_file_graph
+from util.mvs.optimize import get_E_max_stats_for_vm_num
+from util.mvs.partition.algorithm import get_bisection_order
+
+# The first method is the reference of the ratios
+METHODS = ["metis", "hierarchy", "metis-edges", "metis-nodes+edges"]
+
+def sweep_method(graph, n_list, method):
+    """Partition stats of every n with one method, and the time the sweep took."""
+    start_time = time.time()
+    if method == "hierarchy":
+        # Counted in the sweep, as the tree is what it costs
+        get_bisection_order(graph)
+    n2stats = {n: get_E_max_stats_for_vm_num(graph, n, method) for n in n_list}
+    return n2stats, time.time() - start_time
+
+def compare_topo(file_path, n_list, methods):
+    graph = read_topo_file_graph(file_path)
+    print(f"{os.path.basename(file_path)}: {graph.node_num} nodes, {graph.edge_num} links")
+
+    method2n2stats = {}
+    for method in methods:
+        method2n2stats[method], elapsed_time = sweep_method(graph, n_list, method)
+        print(f"  {method:<17} sweep of {len(n_list)} n: {elapsed_time:.3f}s")
+
+    rows = []
+    ref_n2stats = method2n2stats[methods[0]]
+    for n in n_list:
+        row = {"topo": os.path.basename(file_path), "n": n}
+        for method in methods:
+            stats = method2n2stats[method][n]
+            row[f"E_max_{method}"] = stats["E_max"]
+            row[f"cut_link_num_{method}"] = stats["cut_link_num"]
+            row[f"E_max_ratio_{method}"] = stats["E_max"] / max(ref_n2stats[n]["E_max"], 1)
+            row[f"cut_ratio_{method}"] = stats["cut_link_num"] / max(ref_n2stats[n]["cut_link_num"], 1)
+        rows.append(row)
+
+    # Ratios are over the first method, so > 1 means worse
+    for method in methods[1:]:
+        E_max_ratios = np.array([row[f"E_max_ratio_{method}"] for row in rows if row["n"] > 1])
+        cut_ratios = np.array([row[f"cut_ratio_{method}"] for row in rows if row["n"] > 1])
+        if len(E_max_ratios):
+            print(f"  {method:<17} E_max ratio: mean {E_max_ratios.mean():.3f}, "
+                  f"min {E_max_ratios.min():.3f}, max {E_max_ratios.max():.3f}; "
+                  f"cut ratio: mean {cut_ratios.mean():.3f}, "
+                  f"min {cut_ratios.min():.3f}, max {cut_ratios.max():.3f}")
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare E_max(n) of partitioning methods with independent METIS runs.")
+    parser.add_argument("file_paths", type=str, nargs='+', help="Paths to the topology files")
+    parser.add_argument("-n", "--max-vm-num", type=int, default=128, help="Largest VM number n to compare")
+    parser.add_argument("-m", "--methods", type=str, nargs='+', default=METHODS,
+                        help="E_max partitioning methods to compare, relative to the first one")
+    parser.add_argument("-o", "--output-dir", type=str, required=True, help="Directory of the output .csv file")
+    args = parser.parse_args()
+
+    n_list = list(range(1, args.max_vm_num + 1))
+    rows = []
+    for file_path in args.file_paths:
+        rows.extend(compare_topo(file_path, n_list, args.methods))
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    output_path = os.path.join(args.output_dir, "emax_partitioning_comparison.csv")
+    with open(output_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Data written to: {output_path}")
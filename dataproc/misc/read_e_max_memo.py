@@ -0,0 +1,53 @@
+import os
+import sys
+import argparse
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "coordinator"))
+from util.mvs.emax_memo import EMAX_MEMO_DIR, iter_E_max_memos
+
+parser = argparse.ArgumentParser(description='Export E_max(n) from the E_max memo of the coordinator.')
+parser.add_argument(
+    '-i', '--memo-dir', type=str, default=EMAX_MEMO_DIR, help='Directory of the E_max memo')
+parser.add_argument(
+    '-o', '--output-dir', type=str, required=True, help='Directory of the output .csv file')
+parser.add_argument(
+    '--method', type=str, default="metis", help='Partitioning method of the memoized stats')
+args = parser.parse_args()
+
+def get_memo_topo_and_emaxs(memo_dir, method):
+    memo_info = []
+    for memo in iter_E_max_memos(memo_dir):
+        # Graphs swept without a topology name are labelled by their hash
+        topos = memo["labels"] or [memo["graph_hash"]]
+        for seed, n2stats in memo["entries"].get(method, {}).items():
+            for n, stats in n2stats.items():
+                for topo in topos:
+                    memo_info.append({
+                        "topo": topo,
+                        "seed": seed,
+                        "n": int(n),
+                        "E_max(n)": stats["E_max"],
+                        "max_node_count": stats["max_node_count"],
+                        "cut_link_num": stats["cut_link_num"],
+                        "chosen_seed": stats.get("seed"),
+                        "graph_hash": memo["graph_hash"],
+                    })
+    return memo_info
+
+if __name__ == "__main__":
+    memo_info = get_memo_topo_and_emaxs(args.memo_dir, args.method)
+    if not memo_info:
+        print(f"No E_max data found in {args.memo_dir}")
+        exit(1)
+
+    df = pd.DataFrame(memo_info)
+    df = df.sort_values(by=["topo", "seed", "n"])
+
+    # Same layout as read_test_log_e_max.py, with the extra stats appended
+    output_dir = args.output_dir
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, "emax_results.csv")
+    df.to_csv(output_path, index=False)
+
+    print(f"Data written to: {output_path}")
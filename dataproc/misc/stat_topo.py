@@ -1,48 +1,71 @@
+import os
 import sys
-from collections import defaultdict
-
-def analyze_graph(file_path):
-    with open(file_path, 'r') as f:
-        lines = f.readlines()
-
-    # First line: node list
-    nodes = list(map(int, lines[0].split()))
-    node_set = set(nodes)
-    n = len(node_set)
-
-    # Build edge list and degree counter
-    edges = set()
-    degree = defaultdict(int)
-
-    for line in lines[1:]:
-        u, v = map(int, line.split())
-        if u == v:
-            continue  # skip self-loops
-        edge = tuple(sorted((u, v)))  # undirected
-        if edge not in edges:
-            edges.add(edge)
-            degree[u] += 1
-            degree[v] += 1
-
-    m = len(edges)
-
-    degree_values = list(degree.values())
-    min_deg = min(degree_values) if degree_values else 0
-    max_deg = max(degree_values) if degree_values else 0
-    avg_deg = sum(degree_values) / n if n > 0 else 0
-
-    # Graph density (undirected)
-    density = (2 * m) / (n * (n - 1)) if n > 1 else 0
-
-    print(f"Node count     : {n}")
-    print(f"Edge count     : {m}")
-    print(f"Min degree     : {min_deg}")
-    print(f"Average degree : {avg_deg:.2f}")
-    print(f"Max degree     : {max_deg}")
-    print(f"Graph density  : {density:.6f}")
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "coordinator"))
+from util.topo_util import read_topo_file_graph
+from util.topo_catalog import get_topo_stats
+from util.topo_stats import get_graph_stats, DIAMETER_SAMPLE_NUM, CLUSTERING_SAMPLE_NUM
+
+def get_stats_filepath(file_path):
+    return os.path.splitext(file_path)[0] + ".stats.json"
+
+def get_size_stats(file_path):
+    """Node, link and degree statistics of the file as listed, from the topology catalog.
+
+    Dangling nodes count as nodes, self-loops and repeated links are ignored.
+    """
+    topo_stats = get_topo_stats(file_path)
+    n = topo_stats["node_num"]
+    m = topo_stats["simple_link_num"]
+    degree_hist = topo_stats["degree_hist"]
+    # Only nodes with at least one link have a degree
+    linked_degrees = [d for d, count in enumerate(degree_hist) if d > 0 and count > 0]
+    return {
+        "node_num": n,
+        "link_num": m,
+        "min_degree": linked_degrees[0] if linked_degrees else 0,
+        "avg_degree": 2 * m / n if n > 0 else 0.0,
+        "max_degree": linked_degrees[-1] if linked_degrees else 0,
+        "density": (2 * m) / (n * (n - 1)) if n > 1 else 0.0,
+        "degree_hist": degree_hist,
+    }
+
+def analyze_graph(file_path, diameter_sample_num, clustering_sample_num, seed):
+    # The graph comes from the shared loader, so it is normalized: dangling
+    # nodes are dropped and only the structure of linked nodes is sampled
+    start_time = time.time()
+    graph = read_topo_file_graph(file_path)
+    stats = get_graph_stats(graph, diameter_sample_num, clustering_sample_num, seed)
+    stats.update(get_size_stats(file_path))
+    stats["dangling_node_num"] = stats["node_num"] - graph.node_num
+    stats["topo_filepath"] = os.path.abspath(file_path)
+    stats["elapsed_time"] = time.time() - start_time
+
+    print(f"Node count        : {stats['node_num']} ({stats['dangling_node_num']} dangling)")
+    print(f"Edge count        : {stats['link_num']}")
+    print(f"Min degree        : {stats['min_degree']}")
+    print(f"Average degree    : {stats['avg_degree']:.2f}")
+    print(f"Max degree        : {stats['max_degree']}")
+    print(f"Graph density     : {stats['density']:.6f}")
+    print(f"Components        : {stats['component_num']} (largest has {stats['largest_component_size']} nodes)")
+    print(f"Sampled diameter  : {stats['sampled_diameter']}")
+    print(f"Sampled clustering: {stats['sampled_avg_clustering']:.4f}")
+
+    stats_filepath = get_stats_filepath(file_path)
+    with open(stats_filepath, 'w') as f:
+        json.dump(stats, f, indent=1)
+    print(f"Statistics written to {stats_filepath} ({stats['elapsed_time']:.3f}s)")
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python analyze_graph.py <path_to_file>")
-    else:
-        analyze_graph(sys.argv[1])
+    parser = argparse.ArgumentParser(description="Compute statistics of a topology file.")
+    parser.add_argument("file_path", type=str, help="Path to the topology file")
+    parser.add_argument("--diameter-samples", type=int, default=DIAMETER_SAMPLE_NUM,
+                        help="Number of double sweeps for the diameter estimate")
+    parser.add_argument("--clustering-samples", type=int, default=CLUSTERING_SAMPLE_NUM,
+                        help="Number of sampled nodes for the clustering estimate")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the node sampling")
+    args = parser.parse_args()
+    analyze_graph(args.file_path, args.diameter_samples, args.clustering_samples, args.seed)